@@ -0,0 +1,348 @@
+"""
+Benchmarks of the hot paths of modneat.
+
+Times phenotype creation and activation for each network type of
+`modneat.nn`, the genome operators (mutate, configure_crossover, distance),
+speciation and reproduction, checkpoint save/load and the evaluators, at
+several genome and population sizes. Everything is seeded and runs locally.
+
+Usage (from the repository root):
+
+    python benchmarks/benchmark.py --output results.json
+    python benchmarks/benchmark.py --quick --compare results.json
+
+The results are stored as JSON ({"meta": ..., "results": {name: {...}}});
+``--compare`` prints the ratio of each time to that of an earlier results
+file, so runs on different commits can be compared.
+"""
+from __future__ import print_function
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import modneat
+from modneat.checkpoint import Checkpointer
+
+BASE_CONFIG = os.path.join(HERE, '..', 'tests', 'configs', 'float_local.ini')
+
+XOR_INPUTS = [(1.0, 1.0), (1.0, 0.0), (0.0, 1.0), (0.0, 0.0)]
+XOR_OUTPUTS = [0.0, 1.0, 1.0, 0.0]
+
+
+def make_config(network_type, pop_size=150, directory=None):
+    """Returns a config for ``network_type``, derived from the XOR test config."""
+    genome_type = network_type.genome_type()
+    with open(BASE_CONFIG) as f:
+        text = f.read()
+    text = text.replace('[ModGenome]', '[{0}]'.format(genome_type.__name__))
+    text = text.replace('pop_size              = 150', 'pop_size              = {0}'.format(pop_size))
+    if 'Recurrent' in network_type.__name__:
+        text = text.replace('feed_forward            = True', 'feed_forward            = False')
+    filename = os.path.join(directory or tempfile.gettempdir(),
+                            'benchmark-{0}-{1}.ini'.format(network_type.__name__, pop_size))
+    with open(filename, 'w') as f:
+        f.write(text)
+    return modneat.Config(genome_type, modneat.DefaultReproduction, modneat.DefaultSpeciesSet,
+                          modneat.DefaultStagnation, filename)
+
+
+def make_genome(config, key, hidden):
+    """Returns a genome grown by ``hidden`` added nodes (and as many added connections)."""
+    genome = config.genome_type(key)
+    genome.configure_new(config.genome_config)
+    for ignored in range(hidden):
+        genome.mutate_add_node(config.genome_config)
+        genome.mutate_add_connection(config.genome_config)
+    return genome
+
+
+def eval_xor(genome, config):
+    """A cheap evaluation function (module level, so that it can be sent to worker processes)."""
+    net = modneat.nn.ModFeedForward.create(genome, config)
+    net.reset()
+    error = 0.0
+    for xi, xo in zip(XOR_INPUTS, XOR_OUTPUTS):
+        error += abs(net.activate(xi)[0] - xo)
+    return (4 - error) ** 2, None
+
+
+def eval_xor_genomes(genomes, config):
+    for ignored_genome_id, genome in genomes:
+        genome.fitness, genome.history = eval_xor(genome, config)
+
+
+def eval_xor_threaded(genome, config):
+    return eval_xor(genome, config)[0]
+
+
+class Timer(object):
+    """Runs benchmarks and collects their results."""
+    def __init__(self, min_time, repeats):
+        self.min_time = min_time
+        self.repeats = repeats
+        self.results = {}
+
+    def run(self, name, func, setup=None, **info):
+        """
+        Times ``func`` (called with the result of ``setup``, if given, which is
+        not timed): the number of calls per measurement is raised until a
+        measurement takes ``min_time`` seconds, then the fastest of
+        ``repeats`` measurements is kept.
+        """
+        random.seed(0)
+        try:
+            args = () if setup is None else (setup(),)
+            calls = 1
+            while True:
+                elapsed = self._measure(func, args, calls)
+                if elapsed >= self.min_time or calls >= 1 << 20:
+                    break
+                calls *= 2 if elapsed <= 0 else max(2, min(10, int(self.min_time / elapsed) + 1))
+            times = [elapsed] + [self._measure(func, args, calls) for ignored in range(self.repeats - 1)]
+            result = {'seconds_per_call': min(times) / calls,
+                      'median_seconds_per_call': sorted(times)[len(times) // 2] / calls,
+                      'calls': calls, 'repeats': len(times)}
+        except Exception as e: # pylint: disable=broad-except
+            result = {'error': '{0}: {1}'.format(type(e).__name__, e)}
+        result.update(info)
+        self.results[name] = result
+        if 'error' in result:
+            print('{0:<55} ERROR {1}'.format(name, result['error']))
+        else:
+            print('{0:<55} {1:12.3f} us'.format(name, result['seconds_per_call'] * 1e6))
+        sys.stdout.flush()
+
+    @staticmethod
+    def _measure(func, args, calls):
+        start = time.perf_counter()
+        for ignored in range(calls):
+            func(*args)
+        return time.perf_counter() - start
+
+
+def bench_networks(timer, sizes, workdir):
+    for network_type in (modneat.nn.FeedForward, modneat.nn.Recurrent, modneat.nn.ModFeedForward,
+                         modneat.nn.ModRecurrent, modneat.nn.ModIndExHebbFFN):
+        name = network_type.__name__
+        for hidden in sizes:
+            def setup():
+                config = make_config(network_type, directory=workdir)
+                genome = make_genome(config, 1, hidden)
+                # Bypass the phenotype cache, so that every call builds the network.
+                genome.version = None
+                return config, genome
+
+            def create(state):
+                config, genome = state
+                network_type.create(genome, config)
+
+            def setup_net():
+                config, genome = setup()
+                return network_type.create(genome, config)
+
+            def activate(net):
+                for xi in XOR_INPUTS:
+                    net.activate(xi)
+
+            timer.run('nn.{0}.create[hidden={1}]'.format(name, hidden), create, setup)
+            timer.run('nn.{0}.activate_x4[hidden={1}]'.format(name, hidden), activate, setup_net)
+
+
+def bench_genomes(timer, sizes, workdir):
+    config = make_config(modneat.nn.ModFeedForward, directory=workdir)
+    genome_config = config.genome_config
+    for hidden in sizes:
+        def setup():
+            return make_genome(config, 1, hidden), make_genome(config, 2, hidden)
+
+        def mutate(genomes):
+            copy.deepcopy(genomes[0]).mutate(genome_config)
+
+        def mutate_copy_only(genomes):
+            copy.deepcopy(genomes[0])
+
+        def crossover(genomes):
+            genomes[0].fitness, genomes[1].fitness = 1.0, 0.5
+            child = config.genome_type(3)
+            child.configure_crossover(genomes[0], genomes[1], genome_config)
+
+        def distance(genomes):
+            genomes[0].distance(genomes[1], genome_config)
+
+        timer.run('genome.deepcopy[hidden={0}]'.format(hidden), mutate_copy_only, setup)
+        timer.run('genome.deepcopy+mutate[hidden={0}]'.format(hidden), mutate, setup)
+        timer.run('genome.configure_crossover[hidden={0}]'.format(hidden), crossover, setup)
+        timer.run('genome.distance[hidden={0}]'.format(hidden), distance, setup)
+
+
+def evaluated_population(pop_size, workdir, generations=3):
+    """Returns a population that has been evolved (and evaluated) for a few generations."""
+    config = make_config(modneat.nn.ModFeedForward, pop_size=pop_size, directory=workdir)
+    config.no_fitness_termination = True
+    p = modneat.Population(config)
+    p.run(eval_xor_genomes, generations)
+    eval_xor_genomes(list(p.population.items()), config)
+    return p
+
+
+def bench_population(timer, pop_sizes, workdir):
+    for pop_size in pop_sizes:
+        def setup():
+            return evaluated_population(pop_size, workdir)
+
+        def speciate(p):
+            species = copy.deepcopy(p.species)
+            species.speciate(p.config, p.population, p.generation + 1)
+
+        def reproduce(p):
+            reproduction = copy.deepcopy(p.reproduction)
+            species = copy.deepcopy(p.species)
+            reproduction.reproduce(p.config, species, p.config.pop_size, p.generation)
+
+        def copy_state(p):
+            copy.deepcopy(p.species)
+            copy.deepcopy(p.reproduction)
+
+        timer.run('population.copy_state[pop={0}]'.format(pop_size), copy_state, setup)
+        timer.run('population.speciate+copy[pop={0}]'.format(pop_size), speciate, setup)
+        timer.run('population.reproduce+copy[pop={0}]'.format(pop_size), reproduce, setup)
+
+
+def bench_checkpoints(timer, pop_sizes, workdir):
+    for pop_size in pop_sizes:
+        for checkpoint_format, codec in (('pickle', 'gzip'), ('pickle', 'none'), ('pickle', 'lzma'),
+                                         ('columnar', 'gzip')):
+            directory = os.path.join(workdir, 'checkpoints-{0}-{1}-{2}'.format(pop_size, checkpoint_format, codec))
+            os.makedirs(os.path.join(directory, 'checkpoints'), exist_ok=True)
+            label = '{0}/{1}'.format(checkpoint_format, codec) if checkpoint_format == 'pickle' else checkpoint_format
+
+            def setup():
+                p = evaluated_population(pop_size, workdir)
+                checkpointer = Checkpointer(directory, generation_interval=None, time_interval_seconds=None,
+                                            checkpoint_format=checkpoint_format, codec=codec)
+                return p, checkpointer
+
+            def save(state):
+                p, checkpointer = state
+                # The checkpointer announces every save; keep that out of the report.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    checkpointer.save_checkpoint(p.config, p.population, p.species, p.generation)
+
+            def setup_load():
+                p, checkpointer = setup()
+                save((p, checkpointer))
+                return '{0}{1}'.format(checkpointer.filename_prefix, p.generation)
+
+            def load(filename):
+                Checkpointer.restore_checkpoint(filename)
+
+            timer.run('checkpoint.save.{0}[pop={1}]'.format(label, pop_size), save, setup)
+            timer.run('checkpoint.load.{0}[pop={1}]'.format(label, pop_size), load, setup_load)
+
+
+def bench_evaluators(timer, pop_sizes, workers, workdir):
+    for pop_size in pop_sizes:
+        def setup():
+            p = evaluated_population(pop_size, workdir, generations=1)
+            return list(p.population.items()), p.config
+
+        def serial(state):
+            eval_xor_genomes(*state)
+
+        timer.run('evaluator.serial[pop={0}]'.format(pop_size), serial, setup)
+
+        evaluator = modneat.ParallelEvaluator(workers, eval_xor)
+        try:
+            timer.run('evaluator.parallel[pop={0},workers={1}]'.format(pop_size, workers),
+                      lambda state: evaluator.evaluate(*state), setup)
+        finally:
+            evaluator.close()
+
+        with modneat.ThreadedEvaluator(workers, eval_xor_threaded, batch_size=10) as evaluator:
+            timer.run('evaluator.threaded[pop={0},workers={1}]'.format(pop_size, workers),
+                      lambda state: evaluator.evaluate(*state), setup)
+
+
+def metadata():
+    meta = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+    try:
+        meta['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=HERE,
+                                                 stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta['commit'] = None
+    return meta
+
+
+def compare(results, filename):
+    with open(filename) as f:
+        baseline = json.load(f)['results']
+    print('\n{0:<55} {1:>8}'.format('benchmark', 'new/old'))
+    for name in sorted(results):
+        new, old = results[name], baseline.get(name)
+        if (old is None) or ('error' in new) or ('error' in old):
+            continue
+        print('{0:<55} {1:8.2f}'.format(name, new['seconds_per_call'] / old['seconds_per_call']))
+
+
+GROUPS = ('networks', 'genomes', 'population', 'checkpoints', 'evaluators')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', type=str, default='benchmark-results.json', help='file to store the results in')
+    parser.add_argument('--compare', type=str, default=None, help='results file of an earlier run to compare with')
+    parser.add_argument('--quick', action='store_true', help='fewer sizes and shorter measurements')
+    parser.add_argument('--only', type=str, nargs='*', choices=GROUPS, default=list(GROUPS),
+                        help='groups of benchmarks to run')
+    parser.add_argument('--workers', type=int, default=2, help='number of workers of the parallel evaluators')
+    args = parser.parse_args()
+
+    if args.quick:
+        timer = Timer(min_time=0.05, repeats=3)
+        genome_sizes, pop_sizes = (0, 20), (50,)
+    else:
+        timer = Timer(min_time=0.2, repeats=5)
+        genome_sizes, pop_sizes = (0, 10, 50), (50, 150, 500)
+
+    workdir = tempfile.mkdtemp(prefix='modneat-benchmark-')
+    try:
+        if 'networks' in args.only:
+            bench_networks(timer, genome_sizes, workdir)
+        if 'genomes' in args.only:
+            bench_genomes(timer, genome_sizes, workdir)
+        if 'population' in args.only:
+            bench_population(timer, pop_sizes, workdir)
+        if 'checkpoints' in args.only:
+            bench_checkpoints(timer, pop_sizes, workdir)
+        if 'evaluators' in args.only:
+            bench_evaluators(timer, pop_sizes, args.workers, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'results': timer.results}, f, indent=1, sort_keys=True)
+    print('\nResults written to {0}'.format(args.output))
+
+    if args.compare:
+        compare(timer.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
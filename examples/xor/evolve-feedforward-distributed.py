@@ -71,7 +71,8 @@ def run(config_file, addr, authkey, mode, workers):
         addr,  # connect to addr
         authkey,  # use authkey to authenticate
         eval_genome,  # use eval_genome() to evaluate a genome
-        secondary_chunksize=4,  # send 4 genomes at once
+        secondary_chunksize=4,  # send 4 genomes at once, until the
+                                # throughput of a secondary is known
         num_workers=workers,  # when in secondary mode, use this many workers
         worker_timeout=10,  # when in secondary mode and workers > 1,
                             # wait at most 10 seconds for the result
@@ -81,6 +82,9 @@ def run(config_file, addr, authkey, mode, workers):
                     # This causes the DistributedEvaluator to
                     # determine the mode by checking if address
                     # points to the localhost.
+        reporters=p.reporters,  # report the throughput of each secondary
+        ancestors=p.reproduction.ancestors,  # send genomes as differences
+                                             # to their parents
         )
 
     # start the DistributedEvaluator
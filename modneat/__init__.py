@@ -6,16 +6,22 @@ import modneat.distributed as distributed
 import modneat.report_utils as report_utils
 import modneat.report_utils.report_funcs as report_funcs
 
-from modneat.config import Config
+from modneat.config import Config, ConfigSnapshot
 from modneat.population import Population, CompleteExtinctionException
 from modneat.genome import DefaultGenome, ModGenome, ExampleGlobalGenome
 from modneat.reproduction import DefaultReproduction
+from modneat.genealogy import GenealogyLog
 from modneat.stagnation import DefaultStagnation
 from modneat.reporting import StdOutReporter
 from modneat.reporting import FileOutReporter
 from modneat.species import DefaultSpeciesSet
-from modneat.statistics import StatisticsReporter
+from modneat.statistics import StatisticsReporter, StreamingStatisticsReporter
 from modneat.parallel import ParallelEvaluator
 from modneat.distributed import DistributedEvaluator, host_is_local
-from modneat.threaded import ThreadedEvaluator
-from modneat.checkpoint import Checkpointer
\ No newline at end of file
+from modneat.threaded import ThreadedEvaluator, AdaptiveEvaluator
+from modneat.asynchronous import AsyncEvaluator
+from modneat.fitness_cache import FitnessCache
+from modneat.checkpoint import Checkpointer
+from modneat.plotting import PlotReporter
+from modneat.profiling import ProfileReporter
+from modneat.memory import MemoryReporter
@@ -0,0 +1,65 @@
+"""
+Evaluates genomes with `asyncio` coroutines, for evaluation functions that
+spend most of their time waiting (e.g. on simulator processes behind sockets).
+"""
+import asyncio
+import inspect
+
+
+class AsyncEvaluator(object):
+    """
+    Runs a whole generation on one event loop, with at most ``max_concurrency``
+    evaluations in flight at any time.  All evaluations share the calling
+    process, so thousands of them can be waiting on external simulators at once.
+    """
+    def __init__(self, max_concurrency, eval_function, timeout=None):
+        """
+        eval_function should be a coroutine function, ``async def
+        eval_genome(genome, config)``, returning either the genome's fitness
+        or a (fitness, history) tuple as for ParallelEvaluator.
+        ``timeout`` is the maximum number of seconds a single evaluation may
+        take (None for no limit); `asyncio.TimeoutError` is raised if exceeded.
+
+        The event loop is kept between generations, so connections opened by
+        the evaluation function can be reused; call `close` when done, or use
+        the evaluator as a context manager.
+        """
+        if not inspect.iscoroutinefunction(eval_function):
+            raise TypeError("eval_function must be a coroutine function (async def)")
+        self.max_concurrency = max_concurrency
+        self.eval_function = eval_function
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the event loop."""
+        if not self.loop.is_closed():
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    async def _evaluate_one(self, semaphore, genome, config):
+        async with semaphore:
+            if self.timeout is None:
+                result = await self.eval_function(genome, config)
+            else:
+                result = await asyncio.wait_for(self.eval_function(genome, config), self.timeout)
+
+        if isinstance(result, tuple):
+            genome.fitness, genome.history = result
+        else:
+            genome.fitness = result
+
+    async def _evaluate(self, genomes, config):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*[self._evaluate_one(semaphore, genome, config)
+                               for ignored_genome_id, genome in genomes])
+
+    def evaluate(self, genomes, config):
+        """Evaluates the genomes; to be passed to `Population.run`."""
+        self.loop.run_until_complete(self._evaluate(genomes, config))
@@ -1,11 +1,12 @@
 """Uses `pickle` to save and restore populations (and other aspects of the simulation state)."""
 from __future__ import print_function
-from operator import attrgetter
 
+import atexit
+import copy
 import os
-import gzip
 import random
 import time
+from concurrent import futures
 import modneat
 
 try:
@@ -15,7 +16,29 @@ except ImportError:
 
 from modneat.population import Population
 from modneat.reporting import BaseReporter
-from modneat import visualize
+from modneat import columnar
+from modneat import compression
+
+
+def _save_files(filename, checkpoint_format, data, stored, codec, compresslevel, compress_threads):
+    """Writes a checkpoint (``data`` is already pickled for the pickle format)."""
+    if checkpoint_format == 'columnar':
+        generation, config, population, species_set, rndstate = data
+        columnar.save_columnar(filename, generation, config, population, species_set, rndstate,
+                               stored=stored)
+    else:
+        data = compression.compress(data, codec, compresslevel, threads=compress_threads)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+
+def _save_snapshot(snapshot):
+    """
+    Runs `_save_files` in the background process of a `Checkpointer`. The
+    arguments are pickled by the main process, so that the state may change as
+    soon as the snapshot is taken.
+    """
+    _save_files(*pickle.loads(snapshot))
 
 
 class Checkpointer(BaseReporter):
@@ -24,22 +47,57 @@ class Checkpointer(BaseReporter):
     to save and restore populations (and other aspects of the simulation state).
     """
 
-    def __init__(self, savedir, stats, generation_interval=100, time_interval_seconds=300):
+    def __init__(self, savedir, stats=None, generation_interval=100, time_interval_seconds=300,
+                 checkpoint_format='pickle', incremental=False, full_interval=10,
+                 background=False, max_pending=2, codec='gzip', compresslevel=None, compress_threads=None):
         """
         Saves the current state (at the end of a generation) every ``generation_interval`` generations or
         ``time_interval_seconds``, whichever happens first.
 
-        :param str savedir: Name of a directory which store checkpoints and graph
+        :param str savedir: Name of a directory which store checkpoints
+        :param stats: Unused; the figures are drawn by `modneat.plotting.PlotReporter`
         :param generation_interval: If not None, maximum number of generations between save intervals
         :type generation_interval: int or None
         :param time_interval_seconds: If not None, maximum number of seconds between checkpoint attempts
         :type time_interval_seconds: float or None
+        :param str checkpoint_format: 'pickle' (a gzipped pickle) or 'columnar' (see `modneat.columnar`;
+            the history of genomes is not saved)
+        :param bool incremental: For the columnar format, only write genomes that are new since the last
+            checkpoint, referring to the earlier checkpoints for the others
+        :param int full_interval: In incremental mode, write a complete checkpoint every this many checkpoints
+        :param bool background: If True, only a snapshot of the state is taken during the generation; the
+            checkpoint is compressed and written by a background process
+        :param int max_pending: In background mode, the maximum number of checkpoints waiting to be written;
+            a new checkpoint waits for the oldest one once this many are pending
+
+        :param str codec: Compression of the pickle format: 'none', 'gzip', 'lzma', or another codec of
+            `modneat.compression` ('zstd' and 'lz4' if installed)
+        :param compresslevel: Compression level, or None for the codec's default (5 for gzip)
+        :param compress_threads: Number of threads compressing large checkpoints in blocks, or None
+            for the number of CPUs
+
+        In background mode, call `flush` (or `close`) once the run is over; this is also done at exit.
         """
         self.savedir = savedir
         self.stats = stats
         self.generation_interval = generation_interval
         self.time_interval_seconds = time_interval_seconds
         self.filename_prefix = self.savedir + '/checkpoints/checkpoint-'
+        if checkpoint_format not in ('pickle', 'columnar'):
+            raise ValueError("Unknown checkpoint format {0!r}".format(checkpoint_format))
+        self.checkpoint_format = checkpoint_format
+        compression.get_codec(codec) # fail early for unknown codecs
+        self.codec = codec
+        self.compresslevel = compresslevel
+        self.compress_threads = compress_threads
+        self.incremental = incremental
+        self.full_interval = full_interval
+        self.stored = {} # (genome key, version) -> checkpoint holding its genes
+        self.checkpoints_since_full = 0
+        self.background = background
+        self.max_pending = max_pending
+        self.executor = None
+        self.pending = []
 
         self.current_generation = None
         self.last_generation_checkpoint = -1
@@ -66,28 +124,93 @@ class Checkpointer(BaseReporter):
             self.last_generation_checkpoint = self.current_generation
             self.last_time_checkpoint = time.time()
 
+    def found_solution(self, config, generation, best):
+        self.flush()
+
     def save_checkpoint(self, config, population, species_set, generation):
         """ Save the current simulation state. """
         filename = '{0}{1}'.format(self.filename_prefix, generation)
         print("Saving checkpoint to {0}".format(filename))
 
-        with gzip.open(filename, 'w', compresslevel=5) as f:
-            data = (generation, config, population, species_set, random.getstate())
-            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
-
-        """Save the png formatted figure of best network toplogy."""
-        list_of_genome = list(population.values())
-        list_of_genome = sorted(list_of_genome, key=attrgetter('fitness'))
-        best_genome = list_of_genome[-1]
-        visualize.draw_net(config, best_genome, directory=self.savedir+'/bests', filename='best_{0}'.format(generation), show_disabled=False)
-
-        visualize.plot_stats(self.stats, ylog=False, view=False, filename=os.path.join(self.savedir, 'avg_fitness.png'))
-        visualize.plot_species(self.stats, view=False, filename=os.path.join(self.savedir, 'speciation.png'))
+        # The reporters (statistics, this checkpointer, ...) are not part of the saved state.
+        species_set = copy.copy(species_set)
+        species_set.reporters = None
+        data = (generation, config, population, species_set, random.getstate())
+        stored = None
+        if self.checkpoint_format == 'columnar':
+            stored = self._update_stored(filename, population)
+        else:
+            data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+        args = (filename, self.checkpoint_format, data, stored, self.codec, self.compresslevel,
+                self.compress_threads)
+        if not self.background:
+            _save_files(*args)
+            return
+
+        if self.executor is None:
+            self.executor = futures.ProcessPoolExecutor(max_workers=1)
+            atexit.register(self.close)
+        while len(self.pending) >= self.max_pending:
+            self.pending.pop(0).result()
+        snapshot = pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL)
+        self.pending.append(self.executor.submit(_save_snapshot, snapshot))
+
+    def _update_stored(self, filename, population):
+        """
+        Returns the genomes which the columnar checkpoint ``filename`` only has to reference, and
+        records the genomes whose genes it holds for the next checkpoint.
+        """
+        full = (not self.incremental) or (self.checkpoints_since_full >= self.full_interval - 1)
+        if full:
+            self.stored = {}
+            self.checkpoints_since_full = 0
+        else:
+            self.checkpoints_since_full += 1
+        stored = self.stored
+        if self.incremental:
+            # Only genomes still alive can be referenced by the next checkpoint.
+            self.stored = {}
+            for g in population.values():
+                version = getattr(g, 'version', None)
+                if version is not None:
+                    self.stored[(g.key, version)] = stored.get((g.key, version), filename)
+        return stored
+
+    def flush(self):
+        """Waits until all checkpoints have been written; raises the first error of the background process."""
+        pending, self.pending = self.pending, []
+        for job in pending:
+            job.result()
+
+    def close(self):
+        """Writes the pending checkpoints and stops the background process."""
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
 
     @staticmethod
-    def restore_checkpoint(filename):
-        """Resumes the simulation from a previous saved point."""
-        with gzip.open(filename) as f:
-            generation, config, population, species_set, rndstate = pickle.load(f)
-            random.setstate(rndstate)
-            return Population(config, (population, species_set, generation))
+    def restore_checkpoint(filename, savedir=None):
+        """
+        Resumes the simulation from a previous saved point (in any format and
+        compression). ``savedir`` is the directory of the continued run, by
+        default the one the checkpoint was saved from (the parent of its
+        ``checkpoints`` directory). Files of the saved run, such as its
+        genealogy log, are continued in ``savedir`` without being changed.
+        """
+        restored_from = os.path.dirname(os.path.dirname(os.path.abspath(filename)))
+        if savedir is None:
+            savedir = restored_from
+        if columnar.is_columnar(filename):
+            generation, config, population, species_set, rndstate = columnar.load_columnar(filename)
+        else:
+            with open(filename, 'rb') as f:
+                data = compression.decompress(f.read())
+            generation, config, population, species_set, rndstate = pickle.loads(data)
+        random.setstate(rndstate)
+        p = Population(config, (population, species_set, generation), savedir, restored_from)
+        species_set.reporters = p.reporters
+        return p
\ No newline at end of file
@@ -0,0 +1,340 @@
+"""
+A compact binary checkpoint format.
+
+Instead of pickling every genome object, the genes of all genomes are stored
+column by column: for every gene dict of the genomes (``nodes``,
+``connections``, ``global_params``) and gene class, one array holds the row of
+the owning genome, one (or two, for connection keys) the gene keys, and one
+each of the gene attributes. Strings such as activation function names are
+stored as indices into a list of the distinct values. Species membership is
+stored as arrays of genome rows. Everything else (config, random state,
+species statistics and the remaining genome attributes) goes into a pickled
+header.
+
+In incremental mode, genomes whose genes were already written to an earlier
+checkpoint (same key and version stamp) are stored as a reference to that
+file, so only genomes that are new since the last checkpoint are written out.
+The referenced files must then be kept next to the checkpoint.
+
+File layout: `MAGIC`, the length of the header (8 bytes, little endian), the
+pickled header, then the raw bytes of all arrays.
+"""
+from __future__ import print_function
+
+import copy
+import os
+import pickle
+import struct
+import sys
+from array import array
+
+from modneat.genes import BaseGene
+
+MAGIC = b'MODNEAT-COLUMNAR-1\n'
+
+_LENGTH = struct.Struct('<Q')
+
+# attributes of genomes which are stored in columns of their own
+_GENOME_COLUMNS = ('key', 'fitness', 'version')
+
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def is_columnar(filename):
+    """Returns True if the file is a checkpoint in this format."""
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _is_int(v):
+    return (type(v) is int) and (_INT64_MIN <= v <= _INT64_MAX)
+
+
+class _ColumnWriter(object):
+    def __init__(self):
+        self.columns = {} # name -> (kind, offset, size, extra)
+        self.chunks = []
+        self.offset = 0
+
+    def _add_array(self, name, kind, data, extra=None):
+        raw = data.tobytes()
+        self.columns[name] = (kind, self.offset, len(raw), extra)
+        self.chunks.append(raw)
+        self.offset += len(raw)
+
+    def add(self, name, values):
+        """Stores the values in the most compact of the supported column types."""
+        values = list(values)
+        if all(type(v) is bool for v in values):
+            self._add_array(name, 'b', array('b', values))
+        elif all(_is_int(v) for v in values):
+            self._add_array(name, 'q', array('q', values))
+        elif all(type(v) is float for v in values):
+            self._add_array(name, 'd', array('d', values))
+        elif all(isinstance(v, str) for v in values):
+            categories = sorted(set(values))
+            index = {c: i for i, c in enumerate(categories)}
+            self._add_array(name, 'category', array('I', [index[v] for v in values]), categories)
+        else:
+            self.columns[name] = ('object', 0, 0, values)
+
+
+class _ColumnReader(object):
+    def __init__(self, columns, data):
+        self.columns = columns
+        self.data = data
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def get(self, name):
+        kind, offset, size, extra = self.columns[name]
+        if kind == 'object':
+            return extra
+        typecode = 'I' if kind == 'category' else kind
+        values = array(typecode)
+        values.frombytes(self.data[offset:offset + size])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        if kind == 'category':
+            return [extra[i] for i in values]
+        if kind == 'b':
+            return [bool(v) for v in values]
+        return values.tolist()
+
+
+def _gene_dicts(genome):
+    """Returns the names of the attributes of the genome that hold genes."""
+    return [name for name, value in genome.__dict__.items()
+            if value and isinstance(value, dict) and all(isinstance(g, BaseGene) for g in value.values())]
+
+
+def _write_genes(writer, genomes):
+    """Writes the genes of ``genomes`` (a list of genome objects, by row) as gene tables."""
+    tables = {} # (gene dict name, gene class) -> [owners, keys, values]
+    for row, genome in enumerate(genomes):
+        for name in _gene_dicts(genome):
+            for gene_key, gene in getattr(genome, name).items():
+                table = tables.setdefault((name, type(gene)), ([], [], []))
+                table[0].append(row)
+                table[1].append(gene_key)
+                table[2].append(gene)
+
+    descriptions = []
+    for i, ((name, gene_type), (owners, keys, genes)) in enumerate(tables.items()):
+        prefix = 'genes{0}.'.format(i)
+        writer.add(prefix + 'owner', owners)
+        if all(isinstance(k, tuple) and len(k) == 2 and _is_int(k[0]) and _is_int(k[1]) for k in keys):
+            key_kind = 'pair'
+            writer.add(prefix + 'key0', [k[0] for k in keys])
+            writer.add(prefix + 'key1', [k[1] for k in keys])
+        else:
+            key_kind = 'single'
+            writer.add(prefix + 'key', keys)
+        attributes = [a.name for a in gene_type._gene_attributes]
+        for attribute in attributes:
+            writer.add(prefix + attribute, [getattr(g, attribute) for g in genes])
+        descriptions.append((name, gene_type, key_kind, attributes))
+    return descriptions
+
+
+def _read_genes(reader, descriptions, genomes):
+    """Fills the gene dicts of ``genomes`` (a dict of row -> genome) from the gene tables."""
+    for i, (name, gene_type, key_kind, attributes) in enumerate(descriptions):
+        prefix = 'genes{0}.'.format(i)
+        owners = reader.get(prefix + 'owner')
+        if key_kind == 'pair':
+            keys = list(zip(reader.get(prefix + 'key0'), reader.get(prefix + 'key1')))
+        else:
+            keys = reader.get(prefix + 'key')
+        columns = [reader.get(prefix + attribute) for attribute in attributes]
+        for j, (row, gene_key) in enumerate(zip(owners, keys)):
+            genome = genomes.get(row)
+            if genome is None:
+                continue
+            gene = gene_type(gene_key)
+            for attribute, column in zip(attributes, columns):
+                setattr(gene, attribute, column[j])
+            genome.__dict__.setdefault(name, {})[gene_key] = gene
+
+
+def save_columnar(filename, generation, config, population, species_set, rndstate,
+                  stored=None, include_history=False):
+    """
+    Writes a checkpoint. ``stored``, if given, maps the (key, version) of
+    genomes whose genes are in earlier checkpoints to the name of that file;
+    those genomes are only referenced. Returns the same kind of mapping for the
+    genomes whose genes were written to this file.
+    The ``history`` of genomes is only saved if ``include_history`` is True.
+    """
+    genomes = list(population.values())
+    rows = {id(g): row for row, g in enumerate(genomes)}
+    for s in species_set.species.values():
+        # Representatives normally belong to the population, but not necessarily.
+        if (s.representative is not None) and (id(s.representative) not in rows):
+            rows[id(s.representative)] = len(genomes)
+            genomes.append(s.representative)
+
+    stored = stored or {}
+    directory = os.path.dirname(os.path.abspath(filename))
+    sources = []
+    source_rows = []
+    local = []
+    for genome in genomes:
+        source = stored.get((genome.key, getattr(genome, 'version', None)))
+        if (source is None) or (getattr(genome, 'version', None) is None):
+            source_rows.append(-1)
+            local.append(genome)
+        else:
+            source = os.path.relpath(source, directory)
+            if source not in sources:
+                sources.append(source)
+            source_rows.append(sources.index(source))
+
+    writer = _ColumnWriter()
+    writer.add('genome.key', [g.key for g in genomes])
+    writer.add('genome.fitness', [g.fitness for g in genomes])
+    writer.add('genome.version', [getattr(g, 'version', None) for g in genomes])
+    writer.add('genome.source', source_rows)
+    writer.add('genome.class', [type(g).__module__ + ':' + type(g).__qualname__ for g in genomes])
+    gene_dicts = []
+    extras = []
+    for g in genomes:
+        names = _gene_dicts(g)
+        gene_dicts.append(names)
+        extras.append({k: v for k, v in g.__dict__.items()
+                       if (k not in _GENOME_COLUMNS) and (k not in names) and
+                       (include_history or k != 'history')})
+    writer.add('genome.extra', extras)
+    local_rows = [i for i, source in enumerate(source_rows) if source < 0]
+    # Genes are only written for local genomes; their owner column holds rows of the genome table.
+    descriptions = _write_genes(writer, [genomes[i] for i in local_rows])
+    writer.add('genes.rows', local_rows)
+
+    species_keys = list(species_set.species)
+    members = []
+    offsets = [0]
+    for key in species_keys:
+        s = species_set.species[key]
+        members.extend(rows[id(g)] for g in s.members.values())
+        offsets.append(len(members))
+    writer.add('species.members', members)
+    writer.add('species.offsets', offsets)
+    writer.add('species.representative',
+               [-1 if species_set.species[k].representative is None
+                else rows[id(species_set.species[k].representative)] for k in species_keys])
+
+    # The species set and species without their genomes (and reporters).
+    bare_set = copy.copy(species_set)
+    bare_set.species = {}
+    bare_set.reporters = None
+    bare_species = []
+    for key in species_keys:
+        s = copy.copy(species_set.species[key])
+        s.members = {}
+        s.representative = None
+        bare_species.append(s)
+
+    header = {'generation': generation,
+              'population_size': len(population),
+              'config': config,
+              'random_state': rndstate,
+              'species_set': bare_set,
+              'species': bare_species,
+              'gene_tables': descriptions,
+              'sources': sources,
+              'columns': writer.columns}
+    header_data = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header_data)))
+        f.write(header_data)
+        for chunk in writer.chunks:
+            f.write(chunk)
+
+    return {(g.key, getattr(g, 'version', None)): filename for g in local
+            if getattr(g, 'version', None) is not None}
+
+
+def _read_file(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("{0!r} is not a columnar checkpoint".format(filename))
+    start = len(MAGIC)
+    (size,) = _LENGTH.unpack_from(data, start)
+    start += _LENGTH.size
+    header = pickle.loads(data[start:start + size])
+    return header, _ColumnReader(header['columns'], memoryview(data)[start + size:])
+
+
+def _import_class(name):
+    module, qualname = name.split(':')
+    obj = __import__(module, fromlist=['_'])
+    for part in qualname.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _read_genomes(filename, wanted=None):
+    """
+    Returns the genomes of a checkpoint by row, and the header and reader; for
+    genomes stored in other files, only the attributes are filled in. If
+    ``wanted`` is given, only the genomes with these keys are read.
+    """
+    header, reader = _read_file(filename)
+    keys = reader.get('genome.key')
+    fitnesses = reader.get('genome.fitness')
+    versions = reader.get('genome.version')
+    classes = reader.get('genome.class')
+    extras = reader.get('genome.extra')
+    genomes = {}
+    for row, key in enumerate(keys):
+        if (wanted is not None) and (key not in wanted):
+            continue
+        genome = _import_class(classes[row])(key)
+        genome.__dict__.update(extras[row])
+        genome.fitness = fitnesses[row]
+        if versions[row] is not None:
+            genome.version = versions[row]
+        genomes[row] = genome
+
+    local_rows = reader.get('genes.rows')
+    _read_genes(reader, header['gene_tables'],
+                {i: genomes[row] for i, row in enumerate(local_rows) if row in genomes})
+    return genomes, header, reader
+
+
+def load_columnar(filename):
+    """
+    Reads a checkpoint written by `save_columnar`; returns the same
+    (generation, config, population, species_set, random state) tuple as is
+    pickled by the default checkpoint format.
+    """
+    genomes, header, reader = _read_genomes(filename)
+
+    # Genes of genomes stored in earlier checkpoints.
+    sources = reader.get('genome.source')
+    directory = os.path.dirname(os.path.abspath(filename))
+    for i, source in enumerate(header['sources']):
+        referenced = {row: genomes[row] for row, s in enumerate(sources) if s == i}
+        found = _read_genomes(os.path.join(directory, source),
+                              wanted=set(g.key for g in referenced.values()))[0]
+        by_key = {g.key: g for g in found.values()}
+        for genome in referenced.values():
+            stored = by_key[genome.key]
+            for name in _gene_dicts(stored):
+                setattr(genome, name, getattr(stored, name))
+
+    species_set = header['species_set']
+    members = reader.get('species.members')
+    offsets = reader.get('species.offsets')
+    representatives = reader.get('species.representative')
+    for i, s in enumerate(header['species']):
+        s.members = {genomes[row].key: genomes[row] for row in members[offsets[i]:offsets[i + 1]]}
+        s.representative = None if representatives[i] < 0 else genomes[representatives[i]]
+        species_set.species[s.key] = s
+
+    # Rows after the population are representatives which are not members of it.
+    population = {g.key: g for row, g in sorted(genomes.items()) if row < header['population_size']}
+    return header['generation'], header['config'], population, species_set, header['random_state']
@@ -0,0 +1,133 @@
+"""
+Compression codecs for checkpoints.
+
+Large inputs are split into blocks which are compressed by several threads at
+once (zlib, lzma and the optional codecs release the GIL while compressing).
+Each block becomes a complete gzip member, xz stream or zstd/lz4 frame, and
+the concatenation of these is itself a valid file of that format, so it can be
+read by the usual tools (``gunzip``, ``xz -d``, ...) as well as by
+`decompress`, which recognizes the codec from the magic bytes.
+
+The built-in codecs are 'none', 'gzip' and 'lzma'; 'zstd' and 'lz4' are
+available if the ``zstandard`` or ``lz4`` packages are installed. Other codecs
+can be added with `register_codec`.
+"""
+from __future__ import print_function
+
+import gzip
+import lzma
+import os
+from concurrent import futures
+
+DEFAULT_BLOCK_SIZE = 4 << 20
+
+
+class Codec(object):
+    """
+    ``compress(data, level)`` and ``decompress(data)`` both take and return
+    bytes; ``decompress`` must accept the concatenation of several compressed
+    blocks. ``magic`` is the prefix of every compressed block.
+    """
+    def __init__(self, name, magic, compress, decompress, default_level=None):
+        self.name = name
+        self.magic = magic
+        self.compress = compress
+        self.decompress = decompress
+        self.default_level = default_level
+
+
+_codecs = {}
+
+
+def register_codec(codec):
+    """Makes ``codec`` (a `Codec`) available under its name, replacing any codec of the same name."""
+    _codecs[codec.name] = codec
+
+
+def available_codecs():
+    """Returns the names of the codecs that can be used."""
+    return sorted(_codecs)
+
+
+def get_codec(name):
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise ValueError("Unknown compression codec {0!r} (available: {1})".format(
+            name, ', '.join(available_codecs())))
+
+
+def _decompress_frames(data, new_decompressor):
+    """Decompresses concatenated frames with decompressors that stop at the end of a frame."""
+    chunks = []
+    while data:
+        decompressor = new_decompressor()
+        chunks.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(chunks)
+
+
+register_codec(Codec('none', b'', lambda data, level: data, lambda data: data))
+register_codec(Codec('gzip', b'\x1f\x8b',
+                     lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+                     gzip.decompress, default_level=5))
+register_codec(Codec('lzma', b'\xfd7zXZ\x00',
+                     lambda data, level: lzma.compress(data, preset=level),
+                     lzma.decompress, default_level=1))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+else:
+    register_codec(Codec('zstd', b'\x28\xb5\x2f\xfd',
+                         lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+                         lambda data: _decompress_frames(
+                             data, lambda: zstandard.ZstdDecompressor().decompressobj()),
+                         default_level=3))
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+else:
+    register_codec(Codec('lz4', b'\x04\x22\x4d\x18',
+                         lambda data, level: lz4.frame.compress(data, compression_level=level),
+                         lambda data: _decompress_frames(data, lz4.frame.LZ4FrameDecompressor),
+                         default_level=0))
+
+
+def compress(data, codec='gzip', level=None, threads=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Compresses ``data`` with the named codec at ``level`` (None for the
+    codec's default). Inputs larger than ``block_size`` bytes are compressed
+    in blocks by ``threads`` threads (None for the number of CPUs).
+    """
+    codec = get_codec(codec)
+    if level is None:
+        level = codec.default_level
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if (threads <= 1) or (len(data) <= block_size) or (codec.name == 'none'):
+        return codec.compress(data, level)
+
+    view = memoryview(data)
+    blocks = [view[i:i + block_size] for i in range(0, len(data), block_size)]
+    with futures.ThreadPoolExecutor(max_workers=min(threads, len(blocks))) as executor:
+        return b''.join(executor.map(lambda block: codec.compress(bytes(block), level), blocks))
+
+
+def detect(data):
+    """Returns the name of the codec whose magic bytes ``data`` starts with, or None."""
+    for codec in _codecs.values():
+        if codec.magic and data.startswith(codec.magic):
+            return codec.name
+    return None
+
+
+def decompress(data):
+    """Decompresses data written by `compress` with any codec; data without a known magic is returned as is."""
+    name = detect(data)
+    if name is None:
+        return data
+    return get_codec(name).decompress(data)
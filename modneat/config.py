@@ -1,8 +1,12 @@
 """Does general configuration parsing; used by other classes for their configuration."""
 from __future__ import print_function
 
+import hashlib
 import os
+import pickle
+import types
 import warnings
+from collections import OrderedDict
 from configparser import ConfigParser
 
 
@@ -215,3 +219,142 @@ class Config(object):
 
             f.write('\n[{0}]\n'.format(self.reproduction_type.__name__))
             self.reproduction_type.write_config(f, self.reproduction_config)
+
+    def snapshot(self):
+        """Returns a read-only `ConfigSnapshot` of the current configuration."""
+        attributes = {}
+        for name, value in self.__dict__.items():
+            if name in _SECTIONS:
+                value = FrozenSection(value)
+            attributes[name] = value
+        return ConfigSnapshot(attributes, type(self))
+
+
+# The attributes of a Config holding the configuration of the genome, species set, stagnation and reproduction.
+_SECTIONS = ('genome_config', 'species_set_config', 'stagnation_config', 'reproduction_config')
+
+
+class _Frozen(object):
+    """
+    Read-only attributes, plus the methods of ``_source_type`` (bound to this
+    object), so that methods that only read the configuration keep working.
+    """
+    def __init__(self, attributes, source_type):
+        object.__setattr__(self, '_source_type', source_type)
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Configuration snapshots are read-only (setting {0!r})".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("Configuration snapshots are read-only (deleting {0!r})".format(name))
+
+    def __getattr__(self, name):
+        source_type = self.__dict__.get('_source_type')
+        if (source_type is None) or name.startswith('__'):
+            raise AttributeError(name)
+        for cls in source_type.__mro__:
+            if name in cls.__dict__:
+                if isinstance(cls.__dict__[name], types.FunctionType):
+                    return types.MethodType(cls.__dict__[name], self)
+                return getattr(source_type, name)
+        raise AttributeError(name)
+
+
+class _FunctionTable(object):
+    """A read-only copy of an activation or aggregation function set."""
+    def __init__(self, function_set):
+        self.functions = dict(function_set.functions)
+        self.set_type = type(function_set)
+
+    def get(self, name):
+        f = self.functions.get(name)
+        if f is None:
+            # Raise the error of the original set for unknown names.
+            return self.set_type().get(name)
+        return f
+
+    def is_valid(self, name):
+        return name in self.functions
+
+
+class FrozenSection(_Frozen):
+    """
+    A read-only copy of a section of the configuration (e.g. the genome
+    config): its parameters and derived values, with lists turned into
+    tuples and function sets into plain tables, but without the parameter
+    definitions or the state of the node indexer (new node keys cannot be
+    drawn from a snapshot, so genomes cannot be mutated with it).
+    """
+    def __init__(self, section):
+        attributes = {}
+        tables = {}
+        for name, value in section.__dict__.items():
+            if name.startswith('_'):
+                continue
+            if name == 'node_indexer':
+                value = None
+            if isinstance(value, list):
+                value = tuple(value)
+            elif hasattr(value, 'functions') and hasattr(value, 'add'):
+                # activation_defs, aggregation_function_defs and its alias aggregation_defs
+                if id(value) not in tables:
+                    tables[id(value)] = _FunctionTable(value)
+                value = tables[id(value)]
+            attributes[name] = value
+        _Frozen.__init__(self, attributes, type(section))
+
+
+class ConfigSnapshot(_Frozen):
+    """
+    A read-only copy of a `Config` (see `Config.snapshot`), with the same
+    attributes, for the parts of a run that only read the configuration,
+    such as evaluations in worker processes.
+
+    The snapshot is pickled once, when it is created; pickling it again only
+    copies those bytes. Unpickling returns the snapshot already loaded in the
+    process if there is one with the same contents, so all the jobs a worker
+    receives share one object (and the caches keyed by it, such as the
+    phenotype cache). Snapshots with the same contents are equal and have
+    the same hash.
+    """
+    def __init__(self, attributes, source_type, payload=None):
+        if payload is None:
+            payload = pickle.dumps((attributes, source_type), pickle.HIGHEST_PROTOCOL)
+        _Frozen.__init__(self, attributes, source_type)
+        object.__setattr__(self, '_payload', payload)
+        object.__setattr__(self, 'digest', hashlib.sha1(payload).hexdigest())
+
+    def snapshot(self):
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, ConfigSnapshot) and (self.digest == other.digest)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __reduce__(self):
+        return (_load_snapshot, (self.digest, self._payload))
+
+
+# digest -> the snapshots most recently unpickled in this process
+_snapshots = OrderedDict()
+_MAX_SNAPSHOTS = 8
+
+
+def _load_snapshot(digest, payload):
+    snapshot = _snapshots.get(digest)
+    if snapshot is None:
+        attributes, source_type = pickle.loads(payload)
+        snapshot = ConfigSnapshot(attributes, source_type, payload)
+        _snapshots[digest] = snapshot
+        while len(_snapshots) > _MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    else:
+        _snapshots.move_to_end(digest)
+    return snapshot
@@ -7,6 +7,7 @@ import shutil
 def create_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('--path', type=str, help='', default='.')
+    parser.add_argument('--plots', action='store_true', help='draw the fitness and speciation figures from the saved statistics files')
     args = parser.parse_args()
     return args
 
@@ -34,4 +35,10 @@ if __name__=='__main__':
     print("notebook_dir: ", notebook_dir)
     for ipynb_file in ipynb_files:
         shutil.copy(notebook_dir + '/' + ipynb_file, target_path + '/reports/')
-        print('create ' + target_path + '/reports/' + ipynb_file)
\ No newline at end of file
+        print('create ' + target_path + '/reports/' + ipynb_file)
+
+    #保存された統計ファイルから図を描画
+    if args.plots:
+        from modneat.plotting import render_reports
+        for filename in render_reports(target_path, output_directory=target_path + '/reports'):
+            print('create ' + filename)
\ No newline at end of file
@@ -12,20 +12,35 @@ the compute node starts as a primary node, otherwise as a secondary node. If
 ``mode`` is MODE_SECONDARY, the compute node will always start as a secondary node.
 
 There can only be one primary node per NEAT, but any number of secondary nodes.
-The primary node will not evaluate any genomes, which means you will always need
-at least two compute nodes.
+By default, the primary node will not evaluate any genomes, which means you will
+need at least two compute nodes. If ``primary_workers`` is given, the primary
+also runs a pool of that many local worker processes, which takes chunks from
+the same queue as the secondaries; the same script then runs on a single
+machine (with no secondaries at all) as well as on a cluster.
 
 You can run any number of compute nodes on the same physical machine (or VM).
 However, if a machine has both a primary node and one or more secondary nodes,
 MODE_AUTO cannot be used for those secondary nodes - MODE_SECONDARY will need to be
 specified.
 
-NOTE: This module is in a **beta** state, and still *unstable* even in single-machine testing. Reliability is likely to
-vary, including depending on the Python version and implementation (e.g., cpython vs pypy) in use and the likelihoods of
-timeouts (due to machine and/or network slowness). In particular, while the code can try to reconnect between between
-primary and secondary nodes, as noted in the `multiprocessing` documentation this may not work due to data
-loss/corruption. Note also that this module is not responsible for starting the script copies on the different compute
-nodes, since this is very site/configuration-dependent.
+About the transport:
+The primary listens on ``addr``; every secondary keeps one persistent TCP
+connection to it. Both sides first prove knowledge of ``authkey`` (an HMAC
+challenge/response in each direction), after which they exchange pickled
+messages, each framed by an 8-byte length prefix. The config is sent once
+per run, and genomes as their differences to genomes the secondary already
+holds (see the ``genome_deltas`` argument). The primary keeps several
+chunks of tasks in flight per secondary, so that a secondary never waits a
+round trip for its next chunk, and both sides send heartbeats while otherwise
+silent; a peer that stays silent for ``heartbeat_timeout`` seconds is treated
+as lost. Every chunk is leased to a secondary for a limited time; chunks
+whose lease expires, which fail, or which are held by a lost secondary are
+reissued to the remaining ones.
+Chunks are sized from the measured throughput of each secondary, and an idle
+secondary evaluates a copy of a chunk still outstanding elsewhere, so a slow
+secondary does not hold up the end of a generation.
+Note that this module is not responsible for starting the script copies on
+the different compute nodes, since this is very site/configuration-dependent.
 
 Usage:
 1. Import modules and define the evaluation logic (the eval_genome function).
@@ -55,12 +70,21 @@ a primary node or as a secondary node with MODE_AUTO.
 """
 from __future__ import print_function
 
+import hashlib
+import hmac
+import math
+import os
+import pickle
+import select
 import socket
+import struct
 import sys
+import threading
 import time
 import warnings
+from collections import deque
+from itertools import count
 
-# below still needed for queue.Empty
 try:
     # pylint: disable=import-error
     import Queue as queue
@@ -69,15 +93,8 @@ except ImportError:
     import queue
 
 import multiprocessing
-from multiprocessing import managers
-from argparse import Namespace
 
-# Some of this code is based on
-# http://eli.thegreenplace.net/2012/01/24/distributed-computing-in-python-with-multiprocessing
-# According to the website, the code is in the public domain
-# ('public domain' links to unlicense.org).
-# This means that we can use the code from this website.
-# Thanks to Eli Bendersky for making his code open for use.
+from modneat.genes import BaseGene
 
 
 # modes to determine the role of a compute node
@@ -87,10 +104,24 @@ MODE_AUTO = 0  # auto-determine mode
 MODE_PRIMARY = MODE_MASTER = 1  # enforce primary mode
 MODE_SECONDARY = MODE_SLAVE = 2  # enforce secondary mode
 
-# states to determine whether the secondaries should shut down
-_STATE_RUNNING = 0
-_STATE_SHUTDOWN = 1
-_STATE_FORCED_SHUTDOWN = 2
+# message types exchanged between the primary and the secondaries
+_MSG_HELLO = 'hello'  # secondary -> primary: (_MSG_HELLO, num_workers)
+_MSG_CONFIG = 'config'  # primary -> secondary: (_MSG_CONFIG, version, config)
+_MSG_TASKS = 'tasks'  # primary -> secondary: (_MSG_TASKS, chunk_id, epoch, tasks)
+_MSG_RESULTS = 'results'  # secondary -> primary: (_MSG_RESULTS, chunk_id, results)
+_MSG_FAILED = 'failed'  # secondary -> primary: (_MSG_FAILED, chunk_id, reason)
+_MSG_HEARTBEAT = 'heartbeat'  # both directions: (_MSG_HEARTBEAT,)
+_MSG_SHUTDOWN = 'shutdown'  # primary -> secondary: (_MSG_SHUTDOWN, forced)
+
+# length prefix of every frame
+_HEADER = struct.Struct('!Q')
+_CHALLENGE_SIZE = 32
+_MAX_UNAUTHENTICATED_FRAME = 1024
+
+_CONNECTION_ERRORS = (socket.error, EOFError, IOError, OSError)
+
+# key of the genome class in an encoded genome; see `_encode_genome`
+_CLASS_KEY = ('', '__class__')
 
 
 class ModeError(RuntimeError):
@@ -102,6 +133,11 @@ class ModeError(RuntimeError):
     pass
 
 
+class AuthenticationError(RuntimeError):
+    """Raised when a peer does not know the authkey."""
+    pass
+
+
 def host_is_local(hostname, port=22): # no port specified, just use the ssh port
     """
     Returns True if the hostname points to the localhost, otherwise False.
@@ -169,153 +205,351 @@ def chunked(data, chunksize):
     return res
 
 
-class _ExtendedManager(object):
-    """A class for managing the multiprocessing.managers.SyncManager"""
-    __safe_for_unpickling__ = True  # this may not be safe for unpickling,
-                                    # but this is required by pickle.
+def _recv_exactly(sock, size):
+    """Reads exactly ``size`` bytes from the socket."""
+    buf = bytearray()
+    while len(buf) < size:
+        data = sock.recv(min(size - len(buf), 1 << 20))
+        if not data:
+            raise EOFError("Connection closed by peer")
+        buf += data
+    return bytes(buf)
 
-    def __init__(self, addr, authkey, mode, start=False):
-        self.addr = addr
-        self.authkey = authkey
-        self.mode = _determine_mode(addr, mode)
-        self.manager = None
-        self._secondary_state = multiprocessing.managers.Value(int, _STATE_RUNNING)
-        if start:
-            self.start()
 
-    def __reduce__(self):
-        """
-        This method is used by pickle to serialize instances of this class.
-        """
-        return (
-            self.__class__,
-            (self.addr, self.authkey, self.mode, True),
-            )
+def _send_frame(sock, data):
+    sock.sendall(_HEADER.pack(len(data)) + data)
 
-    def start(self):
-        """Starts or connects to the manager."""
-        if self.mode == MODE_PRIMARY:
-            i = self._start()
+
+def _recv_frame(sock, timeout=None, max_size=None):
+    """
+    Reads one length-prefixed frame. If nothing arrives within ``timeout``
+    seconds, `socket.timeout` is raised; once a frame has started, it is read
+    to the end.
+    """
+    if timeout is not None:
+        readable = select.select([sock], [], [], timeout)[0]
+        if not readable:
+            raise socket.timeout("No message within {0} seconds".format(timeout))
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if (max_size is not None) and (size > max_size):
+        raise AuthenticationError("Unexpected frame of {0} bytes".format(size))
+    return _recv_exactly(sock, size)
+
+
+def _send_message(sock, message):
+    """Sends a pickled message; returns its size in bytes."""
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    _send_frame(sock, data)
+    return _HEADER.size + len(data)
+
+
+def _recv_message(sock, timeout=None):
+    return pickle.loads(_recv_frame(sock, timeout))
+
+
+def _authenticate(sock, authkey, role, timeout):
+    """
+    Mutual challenge/response authentication; nothing is unpickled before it
+    succeeds. The responder's role is part of the digest, so that a challenge
+    reflected back at its sender does not authenticate.
+    """
+    if not isinstance(authkey, bytes):
+        authkey = authkey.encode('utf-8')
+    peer_role = b'secondary' if role == b'primary' else b'primary'
+    challenge = os.urandom(_CHALLENGE_SIZE)
+    _send_frame(sock, challenge)
+    peer_challenge = _recv_frame(sock, timeout, _MAX_UNAUTHENTICATED_FRAME)
+    _send_frame(sock, hmac.new(authkey, role + peer_challenge, hashlib.sha256).digest())
+    answer = _recv_frame(sock, timeout, _MAX_UNAUTHENTICATED_FRAME)
+    expected = hmac.new(authkey, peer_role + challenge, hashlib.sha256).digest()
+    if not hmac.compare_digest(answer, expected):
+        raise AuthenticationError("Peer failed to authenticate")
+
+
+def _assign_result(genome, result):
+    """Accepts either a plain fitness or a (fitness, history) tuple as for ParallelEvaluator."""
+    if isinstance(result, tuple):
+        genome.fitness, genome.history = result
+    else:
+        genome.fitness = result
+
+
+def _encode_genome(genome):
+    """
+    Flattens a genome into a dict with one entry per gene, keyed by (name of
+    the gene dict, gene key) and holding (gene class, attribute values), and
+    one entry per other attribute, keyed by ('', attribute name). The key,
+    fitness and history of the genome are left out.
+    """
+    table = {_CLASS_KEY: type(genome)}
+    for name, value in genome.__dict__.items():
+        if name in ('key', 'fitness', 'history'):
+            continue
+        if value and isinstance(value, dict) and all(isinstance(g, BaseGene) for g in value.values()):
+            for gene_key, gene in value.items():
+                table[(name, gene_key)] = (type(gene), tuple(getattr(gene, a.name)
+                                                             for a in gene._gene_attributes))
         else:
-            i = self._connect()
-        self.manager = i
-
-    def stop(self):
-        """Stops the manager."""
-        self.manager.shutdown()
-
-    def set_secondary_state(self, value):
-        """Sets the value for 'secondary_state'."""
-        if value not in (_STATE_RUNNING, _STATE_SHUTDOWN, _STATE_FORCED_SHUTDOWN):
-            raise ValueError(
-                "State {!r} is invalid - needs to be one of _STATE_RUNNING, _STATE_SHUTDOWN, or _STATE_FORCED_SHUTDOWN".format(
-                    value)
+            table[('', name)] = value
+    return table
+
+
+def _decode_genome(genome_id, table):
+    """Rebuilds a genome from the output of `_encode_genome`."""
+    genome = table[_CLASS_KEY](genome_id)
+    gene_dicts = {}
+    for (name, key), value in table.items():
+        if name:
+            gene_type, values = value
+            gene = gene_type(key)
+            for attribute, v in zip(gene_type._gene_attributes, values):
+                setattr(gene, attribute.name, v)
+            gene_dicts.setdefault(name, {})[key] = gene
+        elif (name, key) != _CLASS_KEY:
+            setattr(genome, key, value)
+    for name, genes in gene_dicts.items():
+        setattr(genome, name, genes)
+    return genome
+
+
+def _genome_delta(base, table):
+    """
+    Returns the entries of ``table`` which differ from ``base``, the keys only
+    in ``base``, and the order of the keys of ``table`` if applying the delta
+    to ``base`` would not reproduce it (else None); the order of the genes
+    matters, since it is the order in which networks sum up their inputs.
+    """
+    changed = {k: v for k, v in table.items() if (k not in base) or (base[k] != v)}
+    removed = [k for k in base if k not in table]
+    derived = [k for k in base if k in table] + [k for k in changed if k not in base]
+    order = list(table) if derived != list(table) else None
+    return changed, removed, order
+
+
+def _decode_task(cache, epoch, task):
+    """
+    Returns the (genome_id, genome) pair sent by the primary, and updates the
+    secondary's cache of encoded genomes (genome_id -> (epoch, table)) exactly
+    like the primary's view of it (see `DistributedEvaluator._encode_task`).
+    """
+    if len(task) == 2:
+        return task # sent as a whole
+    genome_id, base_id, changed, removed, order = task
+    if base_id is None:
+        table = {}
+    else:
+        table = dict(cache[base_id][1])
+        cache[base_id] = (epoch, cache[base_id][1])
+    table.update(changed)
+    for k in removed:
+        del table[k]
+    if order is not None:
+        table = {k: table[k] for k in order}
+    cache[genome_id] = (epoch, table)
+    return genome_id, _decode_genome(genome_id, table)
+
+
+class _SecondaryConnection(object):
+    """The primary's view of one connected secondary node."""
+    local = False
+
+    # weight of the newest measurement in the moving average of the throughput
+    THROUGHPUT_SMOOTHING = 0.3
+
+    def __init__(self, sock, address, num_workers):
+        self.sock = sock
+        self.name = "{0}:{1}".format(address[0], address[1])
+        self.num_workers = num_workers
+        self.send_lock = threading.Lock()
+        self.outstanding = {} # chunk_id -> number of genomes in the chunk
+        self.alive = True
+        self.throughput = None # genomes per second, while busy
+        self.genomes_evaluated = 0
+        self.busy_since = None
+        self.busy_genomes = 0
+        self.bytes_sent = 0
+        # what the secondary holds: the version of the config, and the
+        # genomes it may use as the base of a delta (genome_id -> epoch)
+        self.config_version = None
+        self.cached = {}
+        self.epoch = None
+
+    def send(self, message):
+        with self.send_lock:
+            self.bytes_sent += _send_message(self.sock, message)
+
+    def send_chunk(self, chunk_id, num_genomes, message):
+        if not self.outstanding:
+            self.busy_since = time.time()
+            self.busy_genomes = 0
+        self.outstanding[chunk_id] = num_genomes
+        self.send(message)
+
+    def chunk_done(self, chunk_id):
+        """Updates the throughput once the results of a chunk have arrived."""
+        num_genomes = self.outstanding.pop(chunk_id, None)
+        if num_genomes is None:
+            return
+        self.genomes_evaluated += num_genomes
+        # Measured over a whole busy period, since pipelined chunks tend to
+        # finish in bursts.
+        self.busy_genomes += num_genomes
+        rate = self.busy_genomes / max(time.time() - self.busy_since, 1e-6)
+        if self.outstanding:
+            if self.throughput is None:
+                self.throughput = rate # provisional, until the first busy period ends
+        elif self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput += self.THROUGHPUT_SMOOTHING * (rate - self.throughput)
+
+    def close(self):
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except _CONNECTION_ERRORS:
+            pass
+        self.sock.close()
+
+
+class _LocalWorkers(_SecondaryConnection):
+    """A pool of worker processes on the primary, scheduled like a secondary."""
+    local = True
+
+    def __init__(self, num_workers, eval_function, events):
+        _SecondaryConnection.__init__(self, None, ('primary', 'local'), num_workers)
+        self.eval_function = eval_function
+        self.events = events
+        self.config = None
+        self.pool = multiprocessing.Pool(num_workers)
+
+    def send(self, message):
+        if message[0] == _MSG_CONFIG:
+            # Sent with every task; a snapshot is pickled only once.
+            config = message[2]
+            self.config = config.snapshot() if hasattr(config, 'snapshot') else config
+        elif message[0] == _MSG_TASKS:
+            chunk_id, ignored_epoch, tasks = message[1:]
+            genome_ids = [genome_id for genome_id, ignored_genome in tasks]
+            self.pool.starmap_async(
+                self.eval_function,
+                [(genome, self.config) for ignored_genome_id, genome in tasks],
+                callback=lambda res: self.events.put(
+                    (_MSG_RESULTS, self, chunk_id, list(zip(genome_ids, res)))),
+                error_callback=lambda e: self.events.put((_MSG_FAILED, self, chunk_id, repr(e))),
                 )
-        if self.manager is None:
-            raise RuntimeError("Manager not started")
-        self.manager.set_state(value)
 
-    def _get_secondary_state(self):
+    def close(self):
+        self.alive = False
+        self.pool.terminate()
+        self.pool.join()
+
+
+class _Generation(object):
+    """
+    The primary's book-keeping for one call of `DistributedEvaluator.evaluate`.
+
+    Every copy of a chunk sent out holds a lease; a chunk whose lease expires,
+    which fails, or whose holders are all lost is reissued to another
+    secondary. The chunk keeps its id, so the first result to arrive is used
+    and all later ones are discarded.
+    """
+    def __init__(self, genomes, lease_timeout):
+        self.id2genome = dict(genomes)
+        self.pending = deque(genomes)
+        self.remaining = set(self.id2genome)
+        self.lease_timeout = lease_timeout
+        self.chunks = {} # chunk_id -> tasks, for the chunks sent out
+        self.holders = {} # chunk_id -> secondaries the chunk was sent to
+        self.deadlines = {} # chunk_id -> end of the lease of its latest copy
+        self.reissue = deque() # chunk_ids to send to another secondary
+        self.failures = {} # chunk_id -> [number of failures, secondaries which failed it]
+
+    def sent(self, chunk_id, tasks, secondary):
+        self.chunks[chunk_id] = tasks
+        self.holders.setdefault(chunk_id, []).append(secondary)
+        if self.lease_timeout is not None:
+            self.deadlines[chunk_id] = time.time() + self.lease_timeout
+
+    def next_reissue(self, secondary, secondaries):
         """
-        Returns the value for 'secondary_state'.
-        This is required for the manager.
+        Returns the first chunk to reissue which the secondary does not hold and
+        has not failed (unless every secondary has failed it), or None.
         """
-        return self._secondary_state
+        for chunk_id in self.reissue:
+            if secondary in self.holders[chunk_id]:
+                continue
+            failed = self.failures.get(chunk_id, (0, ()))[1]
+            if (secondary in failed) and any(s not in failed for s in secondaries):
+                continue
+            self.reissue.remove(chunk_id)
+            return chunk_id
+        return None
 
-    def _get_manager_class(self, register_callables=False):
+    def steal(self, thief):
         """
-        Returns a new 'Manager' subclass with registered methods.
-        If 'register_callable' is True, defines the 'callable' arguments.
+        Returns the oldest outstanding chunk held by just one other secondary,
+        or None; stolen chunks are evaluated twice and the first result wins.
         """
+        for chunk_id in sorted(self.holders):
+            holders = self.holders[chunk_id]
+            if ((len(holders) == 1) and (thief not in holders) and
+                    (thief not in self.failures.get(chunk_id, (0, ()))[1])):
+                return chunk_id
+        return None
 
-        class _EvaluatorSyncManager(managers.BaseManager):
-            """
-            A custom BaseManager.
-            Please see the documentation of `multiprocessing` for more
-            information.
-            """
-            pass
+    def _drop(self, secondary, chunk_id):
+        """The secondary will not deliver the chunk; reissue it if nobody else will."""
+        holders = self.holders.get(chunk_id)
+        if (holders is None) or (secondary not in holders):
+            return # from an earlier generation, or already done
+        holders.remove(secondary)
+        if (not holders) and (chunk_id not in self.reissue):
+            self.reissue.appendleft(chunk_id)
 
-        inqueue = queue.Queue()
-        outqueue = queue.Queue()
-        namespace = Namespace()
+    def lost(self, secondary):
+        for chunk_id in secondary.outstanding:
+            self._drop(secondary, chunk_id)
+        secondary.outstanding = {}
 
-        if register_callables:
-            _EvaluatorSyncManager.register(
-                "get_inqueue",
-                callable=lambda: inqueue,
-                )
-            _EvaluatorSyncManager.register(
-                "get_outqueue",
-                callable=lambda: outqueue,
-                )
-            _EvaluatorSyncManager.register(
-                "get_state",
-                callable=self._get_secondary_state,
-                )
-            _EvaluatorSyncManager.register(
-                "set_state",
-                callable=lambda v: self._secondary_state.set(v),
-                )
-            _EvaluatorSyncManager.register(
-                "get_namespace",
-                callable=lambda: namespace,
-                )
-        else:
-            _EvaluatorSyncManager.register(
-                "get_inqueue",
-                )
-            _EvaluatorSyncManager.register(
-                "get_outqueue",
-                )
-            _EvaluatorSyncManager.register(
-                "get_state",
-                )
-            _EvaluatorSyncManager.register(
-                "set_state",
-                )
-            _EvaluatorSyncManager.register(
-                "get_namespace",
-                )
-        return _EvaluatorSyncManager
-
-    def _connect(self):
-        """Connects to the manager."""
-        cls = self._get_manager_class(register_callables=False)
-        ins = cls(address=self.addr, authkey=self.authkey)
-        ins.connect()
-        return ins
-
-    def _start(self):
-        """Starts the manager."""
-        cls = self._get_manager_class(register_callables=True)
-        ins = cls(address=self.addr, authkey=self.authkey)
-        ins.start()
-        return ins
-
-    @property
-    def secondary_state(self):
-        """Whether the secondary nodes should still process elements."""
-        v = self.manager.get_state()
-        return v.get()
-
-    def get_inqueue(self):
-        """Returns the inqueue."""
-        if self.manager is None:
-            raise RuntimeError("Manager not started")
-        return self.manager.get_inqueue()
-
-    def get_outqueue(self):
-        """Returns the outqueue."""
-        if self.manager is None:
-            raise RuntimeError("Manager not started")
-        return self.manager.get_outqueue()
-
-    def get_namespace(self):
-        """Returns the namespace."""
-        if self.manager is None:
-            raise RuntimeError("Manager not started")
-        return self.manager.get_namespace()
+    def failed(self, secondary, chunk_id, reason, max_retries, secondaries):
+        """Reissues a failed chunk; gives up once every secondary has failed it too often."""
+        if chunk_id not in self.chunks:
+            return
+        failures = self.failures.setdefault(chunk_id, [0, set()])
+        failures[0] += 1
+        failures[1].add(secondary)
+        if (failures[0] > max_retries) and all(s in failures[1] for s in secondaries):
+            raise RuntimeError("Secondary {0} failed to evaluate a chunk: {1}".format(
+                secondary.name, reason))
+        print("Secondary {0} failed to evaluate chunk {1} ({2}); reissuing it".format(
+            secondary.name, chunk_id, reason), file=sys.stderr)
+        self._drop(secondary, chunk_id)
+
+    def expire(self):
+        """Queues the chunks whose lease has run out for reissue."""
+        now = time.time()
+        for chunk_id, deadline in list(self.deadlines.items()):
+            if deadline < now:
+                del self.deadlines[chunk_id]
+                if chunk_id not in self.reissue:
+                    print("Lease of chunk {0} expired; reissuing it".format(chunk_id),
+                          file=sys.stderr)
+                    self.reissue.append(chunk_id)
+
+    def done(self, chunk_id, results):
+        """Assigns the results of a chunk; results arriving a second time are ignored."""
+        if self.chunks.pop(chunk_id, None) is None:
+            return
+        del self.holders[chunk_id]
+        self.deadlines.pop(chunk_id, None)
+        self.failures.pop(chunk_id, None)
+        if chunk_id in self.reissue:
+            self.reissue.remove(chunk_id)
+        for genome_id, result in results:
+            if genome_id in self.remaining:
+                self.remaining.discard(genome_id)
+                _assign_result(self.id2genome[genome_id], result)
 
 
 class DistributedEvaluator(object):
@@ -329,19 +563,29 @@ class DistributedEvaluator(object):
             num_workers=None,
             worker_timeout=60,
             mode=MODE_AUTO,
+            pipeline_depth=2,
+            heartbeat_interval=1.0,
+            heartbeat_timeout=10.0,
+            adaptive_chunking=True,
+            work_stealing=True,
+            reporters=None,
+            genome_deltas=True,
+            ancestors=None,
+            lease_timeout=None,
+            max_retries=2,
+            primary_workers=0,
             ):
         """
         ``addr`` should be a tuple of (hostname, port) pointing to the machine
         running the DistributedEvaluator in primary mode. If mode is MODE_AUTO,
         the mode is determined by checking whether the hostname points to this
         host or not.
-        ``authkey`` is the password used to restrict access to the manager; see
-        ``Authentication Keys`` in the `multiprocessing` manual for more information.
-        All DistributedEvaluators need to use the same authkey. Note that this needs
-        to be a `bytes` object for Python 3.X, and should be in 2.7 for compatibility
-        (identical in 2.7 to a `str` object).
+        ``authkey`` is the password used to authenticate the connections between
+        the primary and the secondaries; all DistributedEvaluators need to use
+        the same authkey (a `bytes` object; a `str` is encoded as UTF-8).
         ``eval_function`` should take two arguments (a genome object and the
-        configuration) and return a single float (the genome's fitness).
+        configuration) and return a single float (the genome's fitness), or a
+        (fitness, history) tuple as for ParallelEvaluator.
         'secondary_chunksize' specifies the number of genomes that will be sent to
         a secondary at any one time.
         ``num_workers`` is the number of child processes to use if in secondary
@@ -349,8 +593,43 @@ class DistributedEvaluator(object):
         is used to determine this value. If 1 in a secondary node, the process creating
         the DistributedEvaluator instance will also do the evaulations.
         ``worker_timeout`` specifies the timeout (in seconds) for a secondary node
-        getting the results from a worker subprocess; if None, there is no timeout.
+        to evaluate a chunk; if None, there is no timeout. A chunk that times
+        out is reported to the primary as failed, and the secondary replaces
+        its pool of workers once the hung chunks have taken up all its workers
+        (or no other chunk is being evaluated); the chunks still in the old
+        pool are then reported as failed too.
         ``mode`` specifies the mode to run in; it defaults to MODE_AUTO.
+        ``pipeline_depth`` is the number of chunks sent to a secondary beyond
+        those its workers can start on immediately.
+        ``heartbeat_interval`` and ``heartbeat_timeout`` (in seconds) control
+        how often idle peers signal that they are alive, and after how long
+        without any message a peer is considered lost.
+        If ``adaptive_chunking`` is True, ``secondary_chunksize`` is only used
+        until the throughput of a secondary is known; after that, its chunks are
+        sized by its share of the total throughput, and get smaller towards the
+        end of each generation.
+        If ``work_stealing`` is True, a secondary which is idle while others
+        still evaluate is sent a copy of their oldest chunk; the first result
+        to arrive is used.
+        ``reporters`` (e.g. ``population.reporters``), if given, receive the
+        throughput of every secondary as an ``info`` message after each
+        generation; see also `secondary_stats`.
+        The config is sent to each secondary once, and again only when
+        `evaluate` is called with a different config object. If
+        ``genome_deltas`` is True, each secondary keeps the genomes of the last
+        two generations it was sent, and a genome is sent as its differences to
+        one of them: to its own earlier version (elites), or to one of its
+        parents if ``ancestors`` (a dict mapping a genome key to the keys of its
+        parents, e.g. ``population.reproduction.ancestors``) is given.
+        Every chunk sent out is leased for ``lease_timeout`` seconds (by
+        default, ``worker_timeout`` plus ``heartbeat_timeout``; None if both
+        are None). A chunk whose lease expires, which a secondary reports as
+        failed, or whose secondary is lost, is reissued to another secondary;
+        a generation completes as long as one secondary remains. A RuntimeError
+        is raised once a chunk has failed more than ``max_retries`` times and
+        on every connected secondary.
+        ``primary_workers`` is the number of worker processes the primary runs
+        itself, in addition to the secondaries (0 for none).
         """
         self.addr = addr
         self.authkey = authkey
@@ -368,21 +647,43 @@ class DistributedEvaluator(object):
                 self.num_workers = 1
         self.worker_timeout = worker_timeout
         self.mode = _determine_mode(self.addr, mode)
-        self.em = _ExtendedManager(self.addr, self.authkey, mode=self.mode, start=False)
-        self.inqueue = None
-        self.outqueue = None
-        self.namespace = None
+        self.pipeline_depth = pipeline_depth
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.adaptive_chunking = adaptive_chunking
+        self.work_stealing = work_stealing
+        self.reporters = reporters
+        self.genome_deltas = genome_deltas
+        self.ancestors = ancestors
+        self.lease_timeout = lease_timeout
+        self.max_retries = max_retries
+        self.primary_workers = primary_workers
         self.started = False
 
+        # primary state
+        self._listener = None
+        self._acceptor = None
+        self._events = queue.Queue()
+        self._secondaries = []
+        self._secondaries_lock = threading.Lock()
+        self._chunk_ids = count(1)
+        self._config = None
+        self._config_version = 0
+        self._epoch = 0
+        self._tables = {} # genome_id -> (epoch, encoded genome), for the last two epochs
+
+        # secondary state
+        self._secondary_pool = None
+
     def __getstate__(self):
         """Required by the pickle protocol."""
-        # we do not actually save any state, but we need __getstate__ to be
-        # called.
+        # Sockets and threads cannot be pickled; this happens when the
+        # evaluation function holds a reference to the evaluator.
         return True  # return some nonzero value
 
     def __setstate__(self, state):
         """Called when instances of this class are unpickled."""
-        self._set_shared_instances()
+        self.started = False
 
     def is_primary(self):
         """Returns True if the caller is the primary node"""
@@ -395,10 +696,10 @@ class DistributedEvaluator(object):
 
     def start(self, exit_on_stop=True, secondary_wait=0, reconnect=False):
         """
-        If the DistributedEvaluator is in primary mode, starts the manager
-        process and returns. In this case, the ``exit_on_stop`` argument will
+        If the DistributedEvaluator is in primary mode, starts listening for
+        secondaries and returns. In this case, the ``exit_on_stop`` argument will
         be ignored.
-        If the DistributedEvaluator is in secondary mode, it connects to the manager
+        If the DistributedEvaluator is in secondary mode, it connects to the primary
         and waits for tasks.
         If in secondary mode and ``exit_on_stop`` is True, sys.exit() will be called
         when the connection is lost.
@@ -416,7 +717,6 @@ class DistributedEvaluator(object):
             self._start_primary()
         elif self.mode == MODE_SECONDARY:
             time.sleep(secondary_wait)
-            self._start_secondary()
             self._secondary_loop(reconnect=reconnect)
             if exit_on_stop:
                 sys.exit(0)
@@ -426,9 +726,9 @@ class DistributedEvaluator(object):
     def stop(self, wait=1, shutdown=True, force_secondary_shutdown=False):
         """
         Stops all secondaries.
-        'wait' specifies the time (in seconds) to wait before shutting down the
-        manager or returning.
-        If 'shutdown', shutdown the manager.
+        'wait' specifies the time (in seconds) to wait before closing the
+        connections or returning.
+        If 'shutdown', stop listening and close the connections.
         If 'force_secondary_shutdown', shutdown the secondary nodes even if
         they are started with 'reconnect=True'.
         """
@@ -436,121 +736,219 @@ class DistributedEvaluator(object):
             raise ModeError("Not in primary mode!")
         if not self.started:
             raise RuntimeError("Not yet started!")
-        if force_secondary_shutdown:
-            state = _STATE_FORCED_SHUTDOWN
-        else:
-            state = _STATE_SHUTDOWN
-        self.em.set_secondary_state(state)
+        for secondary in self._get_secondaries():
+            try:
+                secondary.send((_MSG_SHUTDOWN, force_secondary_shutdown))
+            except _CONNECTION_ERRORS:
+                pass
         time.sleep(wait)
         if shutdown:
-            self.em.stop()
-        self.started = False
-        self.inqueue = self.outqueue = self.namespace = None
+            self.started = False
+            self._listener.close()
+            self._acceptor.join()
+            for secondary in self._get_secondaries():
+                secondary.close()
+            with self._secondaries_lock:
+                self._secondaries = [s for s in self._secondaries if not s.local]
+            self._listener = self._acceptor = None
+
+    # primary side
 
     def _start_primary(self):
         """Start as the primary"""
-        self.em.start()
-        self.em.set_secondary_state(_STATE_RUNNING)
-        self._set_shared_instances()
-
-    def _start_secondary(self):
-        """Start as a secondary."""
-        self.em.start()
-        self._set_shared_instances()
-
-    def _set_shared_instances(self):
-        """Sets attributes from the shared instances."""
-        self.inqueue = self.em.get_inqueue()
-        self.outqueue = self.em.get_outqueue()
-        self.namespace = self.em.get_namespace()
-
-    def _reset_em(self):
-        """Resets self.em and the shared instances."""
-        self.em = _ExtendedManager(self.addr, self.authkey, mode=self.mode, start=False)
-        self.em.start()
-        self._set_shared_instances()
+        self._listener = socket.socket(socket.AF_INET6 if ':' in self.addr[0] else socket.AF_INET)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(self.addr)
+        self._listener.listen(64)
+        self._listener.settimeout(self.heartbeat_interval)
+        self._acceptor = threading.Thread(name="DistributedEvaluator acceptor",
+                                          target=self._accept_loop)
+        self._acceptor.daemon = True
+        self._acceptor.start()
+        if self.primary_workers:
+            with self._secondaries_lock:
+                self._secondaries.append(_LocalWorkers(self.primary_workers, self.eval_function,
+                                                       self._events))
 
-    def _secondary_loop(self, reconnect=False):
-        """The worker loop for the secondary nodes."""
-        if self.num_workers > 1:
-            pool = multiprocessing.Pool(self.num_workers)
-        else:
-            pool = None
-        should_reconnect = True
-        while should_reconnect:
-            i = 0
-            running = True
+    def _get_secondaries(self):
+        with self._secondaries_lock:
+            return list(self._secondaries)
+
+    def _accept_loop(self):
+        """Accepts new secondaries and sends heartbeats to the connected ones."""
+        while self.started:
             try:
-                self._reset_em()
-            except (socket.error, EOFError, IOError, OSError, socket.gaierror, TypeError):
-                continue
-            while running:
-                i += 1
-                if i % 5 == 0:
-                    # for better performance, only check every 5 cycles
+                sock, address = self._listener.accept()
+            except socket.timeout:
+                for secondary in self._get_secondaries():
                     try:
-                        state = self.em.secondary_state
-                    except (socket.error, EOFError, IOError, OSError, socket.gaierror, TypeError):
-                        if not reconnect:
-                            raise
-                        else:
-                            break
-                    if state == _STATE_FORCED_SHUTDOWN:
-                        running = False
-                        should_reconnect = False
-                    elif state == _STATE_SHUTDOWN:
-                        running = False
-                    if not running:
-                        continue
-                try:
-                    tasks = self.inqueue.get(block=True, timeout=0.2)
-                except queue.Empty:
-                    continue
-                except (socket.error, EOFError, IOError, OSError, socket.gaierror, TypeError):
-                    break
-                except (managers.RemoteError, multiprocessing.ProcessError) as e:
-                    if ('Empty' in repr(e)) or ('TimeoutError' in repr(e)):
-                        continue
-                    if (('EOFError' in repr(e)) or ('PipeError' in repr(e)) or
-                          ('AuthenticationError' in repr(e))): # Second for Python 3.X, Third for 3.6+
+                        secondary.send((_MSG_HEARTBEAT,))
+                    except _CONNECTION_ERRORS:
+                        pass # noticed by the reader thread
+                continue
+            except _CONNECTION_ERRORS:
+                break # listener closed
+            reader = threading.Thread(name="DistributedEvaluator reader {0}".format(address),
+                                      target=self._read_loop, args=(sock, address))
+            reader.daemon = True
+            reader.start()
+
+    def _read_loop(self, sock, address):
+        """Authenticates a secondary, then forwards everything it sends to the event queue."""
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            _authenticate(sock, self.authkey, b'primary', self.heartbeat_timeout)
+            message = _recv_message(sock, self.heartbeat_timeout)
+            if message[0] != _MSG_HELLO:
+                raise AuthenticationError("Expected hello, got {0!r}".format(message[0]))
+        except (AuthenticationError, socket.timeout) + _CONNECTION_ERRORS as e:
+            print("Rejected connection from {0}: {1!r}".format(address, e), file=sys.stderr)
+            sock.close()
+            return
+
+        secondary = _SecondaryConnection(sock, address, message[1])
+        with self._secondaries_lock:
+            self._secondaries.append(secondary)
+        self._events.put(('connected', secondary))
+        try:
+            while secondary.alive:
+                message = _recv_message(sock, self.heartbeat_timeout)
+                if message[0] in (_MSG_RESULTS, _MSG_FAILED):
+                    self._events.put((message[0], secondary, message[1], message[2]))
+        except (socket.timeout, pickle.UnpicklingError) + _CONNECTION_ERRORS:
+            pass
+        with self._secondaries_lock:
+            self._secondaries.remove(secondary)
+        secondary.close()
+        self._events.put(('lost', secondary))
+
+    def _capacity(self, secondary):
+        """The number of chunks that may be outstanding at the secondary."""
+        return -(-secondary.num_workers // self.secondary_chunksize) + self.pipeline_depth
+
+    def _chunk_size(self, secondary, num_pending, total_throughput):
+        """
+        Guided self-scheduling: each chunk gets a share of the pending genomes
+        proportional to the throughput of the secondary, spread over the chunks
+        it may have outstanding, so chunks shrink towards the end of a generation.
+        """
+        if (not self.adaptive_chunking) or (not secondary.throughput) or (not total_throughput):
+            return self.secondary_chunksize
+        share = secondary.throughput / total_throughput
+        return max(1, int(math.ceil(num_pending * share / self._capacity(secondary))))
+
+    def _dispatch(self, generation):
+        """
+        Hands out chunks to reissue, then pending tasks, then (once there are
+        none) copies of outstanding chunks to secondaries with free capacity.
+        """
+        secondaries = [s for s in self._get_secondaries() if s.alive]
+        total_throughput = sum(s.throughput for s in secondaries if s.throughput)
+        for secondary in secondaries:
+            while secondary.alive and (len(secondary.outstanding) < self._capacity(secondary)):
+                chunk_id = generation.next_reissue(secondary, secondaries)
+                if chunk_id is not None:
+                    tasks = generation.chunks[chunk_id]
+                elif generation.pending:
+                    size = self._chunk_size(secondary, len(generation.pending), total_throughput)
+                    tasks = [generation.pending.popleft()
+                             for ignored in range(min(size, len(generation.pending)))]
+                    chunk_id = next(self._chunk_ids)
+                elif self.work_stealing and not secondary.outstanding:
+                    chunk_id = generation.steal(secondary)
+                    if chunk_id is None:
                         break
-                    raise
-                if pool is None:
-                    res = []
-                    for genome_id, genome, config in tasks:
-                        fitness = self.eval_function(genome, config)
-                        res.append((genome_id, fitness))
+                    tasks = generation.chunks[chunk_id]
                 else:
-                    genome_ids = []
-                    jobs = []
-                    for genome_id, genome, config in tasks:
-                        genome_ids.append(genome_id)
-                        jobs.append(
-                            pool.apply_async(
-                                self.eval_function, (genome, config)
-                                )
-                            )
-                    results = [
-                        job.get(timeout=self.worker_timeout) for job in jobs
-                        ]
-                    res = zip(genome_ids, results)
-                try:
-                    self.outqueue.put(res)
-                except (socket.error, EOFError, IOError, OSError, socket.gaierror, TypeError):
                     break
-                except (managers.RemoteError, multiprocessing.ProcessError) as e:
-                    if ('Empty' in repr(e)) or ('TimeoutError' in repr(e)):
-                        continue
-                    if (('EOFError' in repr(e)) or ('PipeError' in repr(e)) or
-                          ('AuthenticationError' in repr(e))): # Second for Python 3.X, Third for 3.6+
-                        break
-                    raise
+                generation.sent(chunk_id, tasks, secondary)
+                try:
+                    self._send_chunk(secondary, chunk_id, tasks)
+                except _CONNECTION_ERRORS:
+                    break # the reader thread reports the loss
 
-            if not reconnect:
-                should_reconnect = False
-                break
-        if pool is not None:
-            pool.terminate()
+    def _encode_task(self, secondary, genome_id):
+        """Encodes a genome as its smallest delta to a genome the secondary holds."""
+        table = self._tables[genome_id][1]
+        candidates = (genome_id,)
+        if self.ancestors is not None:
+            candidates += tuple(self.ancestors.get(genome_id, ()))
+        task = (genome_id, None, table, [], None)
+        size = len(table)
+        for base_id in candidates:
+            if (base_id in secondary.cached) and (base_id in self._tables):
+                changed, removed, order = _genome_delta(self._tables[base_id][1], table)
+                delta_size = len(changed) + len(removed) + (len(order) // 4 if order else 0)
+                if delta_size < size:
+                    task, size = (genome_id, base_id, changed, removed, order), delta_size
+        # Mirrors `_decode_task` on the secondary.
+        if task[1] is not None:
+            secondary.cached[task[1]] = self._epoch
+        secondary.cached[genome_id] = self._epoch
+        return task
+
+    def _send_chunk(self, secondary, chunk_id, tasks):
+        if secondary.config_version != self._config_version:
+            secondary.send((_MSG_CONFIG, self._config_version, self._config))
+            secondary.config_version = self._config_version
+        if secondary.epoch != self._epoch:
+            # The secondary drops the same genomes on the first chunk of an epoch.
+            secondary.cached = {k: e for k, e in secondary.cached.items() if e >= self._epoch - 1}
+            secondary.epoch = self._epoch
+        if self.genome_deltas and not secondary.local:
+            encoded = [self._encode_task(secondary, genome_id) for genome_id, ignored_genome in tasks]
+        else:
+            encoded = tasks
+        secondary.send_chunk(chunk_id, len(tasks), (_MSG_TASKS, chunk_id, self._epoch, encoded))
+
+    def _start_epoch(self, genomes, config):
+        """Versions the config and encodes the genomes of a new generation."""
+        if config is not self._config:
+            self._config = config
+            self._config_version += 1
+        self._epoch += 1
+        if not self.genome_deltas:
+            return
+        secondaries = self._get_secondaries()
+        for genome_id, genome in genomes:
+            table = _encode_genome(genome)
+            old = self._tables.get(genome_id)
+            if (old is not None) and (old[1] != table):
+                # Changed in place since it was sent; not usable as a base anymore.
+                for secondary in secondaries:
+                    secondary.cached.pop(genome_id, None)
+            self._tables[genome_id] = (self._epoch, table)
+        self._tables = {k: v for k, v in self._tables.items() if v[0] >= self._epoch - 1}
+
+    def secondary_stats(self):
+        """
+        Returns a dict mapping the name of each connected secondary to a dict
+        with its ``throughput`` (genomes per second), ``genomes_evaluated`` and
+        ``bytes_sent`` (to the secondary).
+        """
+        return {s.name: {'throughput': s.throughput,
+                         'genomes_evaluated': s.genomes_evaluated,
+                         'bytes_sent': s.bytes_sent}
+                for s in self._get_secondaries()}
+
+    def _report_stats(self):
+        if self.reporters is None:
+            return
+        for name, stats in sorted(self.secondary_stats().items()):
+            if stats['throughput'] is None:
+                continue
+            self.reporters.info(
+                "Secondary {0}: {throughput:.1f} genomes/sec, {genomes_evaluated} evaluated, "
+                "{bytes_sent} bytes sent".format(name, **stats))
+
+    def _lease_timeout(self):
+        if self.lease_timeout is not None:
+            return self.lease_timeout
+        if self.worker_timeout is not None:
+            # By then, the secondary should have reported the chunk as failed.
+            return self.worker_timeout + self.heartbeat_timeout
+        return None
 
     def evaluate(self, genomes, config):
         """
@@ -560,22 +958,179 @@ class DistributedEvaluator(object):
         """
         if self.mode != MODE_PRIMARY:
             raise ModeError("Not in primary mode!")
-        tasks = [(genome_id, genome, config) for genome_id, genome in genomes]
-        id2genome = {genome_id: genome for genome_id, genome in genomes}
-        tasks = chunked(tasks, self.secondary_chunksize)
-        n_tasks = len(tasks)
-        for task in tasks:
-            self.inqueue.put(task)
-        tresults = []
-        while len(tresults) < n_tasks:
+        self._start_epoch(genomes, config)
+        generation = _Generation(genomes, self._lease_timeout())
+        while generation.remaining:
+            generation.expire()
+            self._dispatch(generation)
             try:
-                sr = self.outqueue.get(block=True, timeout=0.2)
-            except (queue.Empty, managers.RemoteError):
+                event = self._events.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
                 continue
-            tresults.append(sr)
-        results = []
-        for sr in tresults:
-            results += sr
-        for genome_id, fitness in results:
-            genome = id2genome[genome_id]
-            genome.fitness = fitness
+            kind, secondary = event[:2]
+            if kind == 'lost':
+                generation.lost(secondary)
+            elif kind == _MSG_RESULTS:
+                chunk_id, results = event[2:]
+                secondary.chunk_done(chunk_id)
+                generation.done(chunk_id, results)
+            elif kind == _MSG_FAILED:
+                chunk_id, reason = event[2:]
+                secondary.outstanding.pop(chunk_id, None)
+                generation.failed(secondary, chunk_id, reason, self.max_retries,
+                                  self._get_secondaries())
+        self._report_stats()
+
+    # secondary side
+
+    def _secondary_loop(self, reconnect=False):
+        """The worker loop for the secondary nodes."""
+        if self.num_workers > 1:
+            self._secondary_pool = multiprocessing.Pool(self.num_workers)
+        else:
+            self._secondary_pool = None
+        try:
+            while True:
+                try:
+                    sock = socket.create_connection(self.addr, timeout=self.heartbeat_timeout)
+                except _CONNECTION_ERRORS:
+                    if not reconnect:
+                        raise
+                    time.sleep(self.heartbeat_interval)
+                    continue
+                try:
+                    forced = self._serve_primary(sock)
+                except (AuthenticationError, socket.timeout) + _CONNECTION_ERRORS:
+                    if not reconnect:
+                        raise
+                    forced = False
+                finally:
+                    sock.close()
+                if forced or not reconnect:
+                    break
+        finally:
+            if self._secondary_pool is not None:
+                self._secondary_pool.terminate()
+                self._secondary_pool = None
+
+    def _serve_primary(self, sock):
+        """
+        Evaluates the chunks sent over one connection until the primary shuts
+        down (returns True for a forced shutdown) or the connection is lost.
+        """
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _authenticate(sock, self.authkey, b'secondary', self.heartbeat_timeout)
+        send_lock = threading.Lock()
+        stopped = threading.Event()
+        jobs = {} # chunk_id -> deadline of the chunks being evaluated by the pool
+        jobs_lock = threading.Lock()
+        num_hung = [0] # workers taken up by chunks that timed out
+
+        def send(message):
+            with send_lock:
+                _send_message(sock, message)
+
+        def finish(chunk_id, message):
+            # Called from the pool's result thread, or on timeout; the first one wins.
+            with jobs_lock:
+                if chunk_id not in jobs:
+                    return
+                del jobs[chunk_id]
+            try:
+                send(message)
+            except _CONNECTION_ERRORS:
+                pass # noticed by the main loop
+
+        def submit(chunk_id, tasks, config):
+            genome_ids = [genome_id for genome_id, ignored_genome in tasks]
+            with jobs_lock:
+                jobs[chunk_id] = None if self.worker_timeout is None else time.time() + self.worker_timeout
+            self._secondary_pool.starmap_async(
+                self.eval_function,
+                [(genome, config) for ignored_genome_id, genome in tasks],
+                callback=lambda res: finish(chunk_id, (_MSG_RESULTS, chunk_id, list(zip(genome_ids, res)))),
+                error_callback=lambda e: finish(chunk_id, (_MSG_FAILED, chunk_id, repr(e))),
+                )
+
+        def check_deadlines():
+            """Reports the chunks that timed out as failed, and replaces the pool if they hang all its workers."""
+            now = time.time()
+            with jobs_lock:
+                expired = [c for c, deadline in jobs.items() if (deadline is not None) and (now > deadline)]
+            for chunk_id in expired:
+                num_hung[0] += 1
+                finish(chunk_id, (_MSG_FAILED, chunk_id,
+                                  "not evaluated within {0} seconds".format(self.worker_timeout)))
+            with jobs_lock:
+                replace = num_hung[0] and ((num_hung[0] >= self.num_workers) or not jobs)
+                abandoned = list(jobs) if replace else []
+            if not replace:
+                return
+            self._secondary_pool.terminate()
+            self._secondary_pool.join()
+            self._secondary_pool = multiprocessing.Pool(self.num_workers)
+            num_hung[0] = 0
+            for chunk_id in abandoned:
+                finish(chunk_id, (_MSG_FAILED, chunk_id, "abandoned with the hung workers of the secondary"))
+
+        def receive_timeout():
+            """Waits for messages at most until the next deadline of a chunk."""
+            with jobs_lock:
+                deadlines = [deadline for deadline in jobs.values() if deadline is not None]
+            if not deadlines:
+                return self.heartbeat_interval
+            return max(0.01, min(self.heartbeat_interval, min(deadlines) - time.time()))
+
+        def heartbeat():
+            while not stopped.wait(self.heartbeat_interval):
+                try:
+                    send((_MSG_HEARTBEAT,))
+                except _CONNECTION_ERRORS:
+                    return
+
+        send((_MSG_HELLO, self.num_workers))
+        heartbeat_thread = threading.Thread(name="DistributedEvaluator heartbeat", target=heartbeat)
+        heartbeat_thread.daemon = True
+        heartbeat_thread.start()
+
+        config = None
+        cache = {} # genome_id -> (epoch, encoded genome)
+        epoch = None
+        last_seen = time.time()
+        try:
+            while True:
+                try:
+                    message = _recv_message(sock, receive_timeout())
+                except socket.timeout:
+                    if time.time() - last_seen > self.heartbeat_timeout:
+                        raise
+                    message = None
+                # Checked after every message (heartbeats arrive more often than the receive times out).
+                if self._secondary_pool is not None:
+                    check_deadlines()
+                if message is None:
+                    continue
+                last_seen = time.time()
+                if message[0] == _MSG_SHUTDOWN:
+                    return message[1]
+                elif message[0] == _MSG_CONFIG:
+                    config = message[2]
+                elif message[0] == _MSG_TASKS:
+                    chunk_id, task_epoch, encoded = message[1:]
+                    if task_epoch != epoch:
+                        cache = {k: v for k, v in cache.items() if v[0] >= task_epoch - 1}
+                        epoch = task_epoch
+                    tasks = [_decode_task(cache, epoch, task) for task in encoded]
+                    if self._secondary_pool is None:
+                        try:
+                            res = [(genome_id, self.eval_function(genome, config))
+                                   for genome_id, genome in tasks]
+                        except Exception as e: # pylint: disable=broad-except
+                            send((_MSG_FAILED, chunk_id, repr(e)))
+                        else:
+                            send((_MSG_RESULTS, chunk_id, res))
+                    else:
+                        submit(chunk_id, tasks, config)
+        finally:
+            stopped.set()
@@ -0,0 +1,112 @@
+"""
+Memoizes fitness results, so that genomes which are genetically identical to
+an already evaluated one (clones produced by crossover of a genome with itself,
+and elites carried over unchanged) are not evaluated again.
+"""
+from __future__ import print_function
+
+import hashlib
+from collections import OrderedDict
+
+from modneat import instrumentation
+
+
+def content_hash(genome):
+    """
+    Returns a canonical hash of the genes that determine the phenotype: all
+    node and global genes and the enabled connection genes, in key order, with
+    their attribute values. The genome key and fitness are not included.
+    """
+    h = hashlib.sha1()
+    for name in ('global_params', 'nodes', 'connections'):
+        genes = getattr(genome, name, {})
+        for key in sorted(genes):
+            gene = genes[key]
+            if getattr(gene, 'enabled', True) is False:
+                continue
+            values = tuple(getattr(gene, a.name) for a in gene._gene_attributes if a.name != 'enabled')
+            h.update(repr((name, key, values)).encode('utf-8'))
+    return h.hexdigest()
+
+
+class FitnessCache(object):
+    """
+    Wraps a fitness function (anything taking the list of (genome_id, genome)
+    tuples and the config, such as ``ParallelEvaluator.evaluate``), and only
+    passes it the genomes whose result is not known yet.
+
+    If ``deterministic`` is True, the result of a genome is reused for every
+    genome with the same `content_hash`. Otherwise the task is assumed to be
+    noisy, and only genomes carried over unchanged (same key, same content)
+    reuse their earlier result; clones with a new key are evaluated again.
+
+    At most ``max_entries`` fitnesses are kept, dropping the least recently
+    used ones first. The history assigned by the fitness function (which may
+    hold copies of the network for every activation) is only kept for the
+    ``history_entries`` most recently used results, 0 by default; genomes
+    whose result is taken from the cache without its history get
+    ``history = None``. If ``reporters`` (e.g. ``population.reporters``) is
+    given, the hit rate of every generation is sent to them as an ``info``
+    message.
+    """
+    def __init__(self, fitness_function, deterministic=True, max_entries=10000, reporters=None,
+                 history_entries=0):
+        self.fitness_function = fitness_function
+        self.deterministic = deterministic
+        self.max_entries = max_entries
+        self.history_entries = history_entries
+        self.reporters = reporters
+        self.results = OrderedDict() # cache key -> fitness
+        self.histories = OrderedDict() # cache key -> history, for the last history_entries results
+        self.hits = 0
+        self.lookups = 0
+        self.generation_stats = [] # (hits, lookups) of each call of evaluate
+
+    def _key(self, genome_id, genome):
+        if self.deterministic:
+            return content_hash(genome)
+        return genome_id, content_hash(genome)
+
+    def evaluate(self, genomes, config):
+        """Assigns the cached results and evaluates the remaining genomes; to be passed to `Population.run`."""
+        misses = OrderedDict() # cache key -> genomes needing the result
+        hits = 0
+        for genome_id, genome in genomes:
+            key = self._key(genome_id, genome)
+            if key in self.results:
+                self.results.move_to_end(key)
+                genome.fitness = self.results[key]
+                genome.history = self.histories.get(key)
+                if genome.history is not None:
+                    self.histories.move_to_end(key)
+                hits += 1
+            else:
+                misses.setdefault(key, []).append((genome_id, genome))
+
+        # Identical genomes within the generation are evaluated only once.
+        if misses:
+            self.fitness_function([same[0] for same in misses.values()], config)
+        for key, same in misses.items():
+            evaluated = same[0][1]
+            history = getattr(evaluated, 'history', None)
+            for ignored_genome_id, genome in same[1:]:
+                genome.fitness, genome.history = evaluated.fitness, history
+            self.results[key] = evaluated.fitness
+            if self.history_entries and (history is not None):
+                self.histories[key] = history
+        while len(self.results) > self.max_entries:
+            self.histories.pop(self.results.popitem(last=False)[0], None)
+        while len(self.histories) > self.history_entries:
+            self.histories.popitem(last=False)
+
+        self.hits += hits
+        self.lookups += len(genomes)
+        instrumentation.count('fitness_cache_hits', hits)
+        self.generation_stats.append((hits, len(genomes)))
+        if self.reporters is not None:
+            self.reporters.info("Fitness cache: {0}/{1} hits ({2:.1%}), {3} genomes evaluated".format(
+                hits, len(genomes), hits / float(max(1, len(genomes))), len(misses)))
+
+    def hit_rate(self):
+        """The fraction of genomes, over the whole run, whose fitness was taken from the cache."""
+        return self.hits / float(max(1, self.lookups))
@@ -0,0 +1,243 @@
+"""
+Records of the parents of the genomes created by `DefaultReproduction`,
+kept according to its ``ancestry`` setting:
+
+* ``all``: every genome ever created, in a dict (the default);
+* ``recent``: only the genomes created in the last ``ancestry_generations``
+  generations (`RecentAncestry`);
+* ``none``: nothing (a `RecentAncestry` of zero generations);
+* ``log``: every genome, in a binary file (`GenealogyLog`), of which only
+  the last ``ancestry_generations`` generations are also kept in memory.
+  A relative ``ancestry_log`` path is taken relative to the ``savedir`` of
+  the `Population` (the current directory if it has none). A new run
+  overwrites the log. A run restored from a checkpoint into another
+  directory starts its log with a copy of the records of the saved run up
+  to the checkpoint; one restored into the directory of the saved run
+  appends to its log (see `GenealogyLog.resume`). The log of the saved run
+  is never changed.
+
+All of them support ``ancestors[key] = parents``, ``ancestors.get(key)``,
+``key in ancestors`` and `lineage`.
+"""
+from __future__ import print_function
+
+import os
+import struct
+from collections import deque
+
+
+def lineage(ancestors, key, generations=None):
+    """
+    Returns a dict mapping ``key`` and each of its recorded ancestors, up to
+    ``generations`` generations back (all if None), to the keys of its
+    parents; genomes whose parents are not recorded are left out.
+    """
+    result = {}
+    level = [key]
+    depth = 0
+    while level and (generations is None or depth < generations):
+        next_level = []
+        for k in level:
+            parents = ancestors.get(k)
+            if (parents is None) or (k in result):
+                continue
+            result[k] = parents
+            next_level.extend(parents)
+        level = next_level
+        depth += 1
+    return result
+
+
+class RecentAncestry(object):
+    """The parents of the genomes created in the last ``generations`` generations."""
+    def __init__(self, generations):
+        self.generations = generations
+        self.recent = deque(maxlen=generations)
+        self.next_generation()
+
+    def next_generation(self):
+        """Starts a new generation, forgetting the oldest one once ``generations`` are kept."""
+        if self.generations > 0:
+            self.recent.append({})
+
+    def __setitem__(self, key, parents):
+        if self.recent:
+            self.recent[-1][key] = parents
+
+    def get(self, key, default=None):
+        for generation in reversed(self.recent):
+            if key in generation:
+                return generation[key]
+        return default
+
+    def __getitem__(self, key):
+        parents = self.get(key)
+        if parents is None:
+            raise KeyError(key)
+        return parents
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return sum(len(generation) for generation in self.recent)
+
+    def lineage(self, key, generations=None):
+        return lineage(self, key, generations)
+
+
+class GenealogyLog(object):
+    """
+    Appends the parents of every genome to the file ``path`` as fixed-size
+    records, in the order of the genome keys (which `DefaultReproduction`
+    assigns in increasing order), so that the records of a genome are found
+    by binary search in the file without holding an index in memory. The
+    genomes of the last ``cache_generations`` generations are also kept in
+    memory for quick lookups.
+
+    The file is opened when it is first used: ``mode='w'`` starts a new log,
+    ``mode='a'`` continues an existing one (created if missing), and
+    ``mode='r'`` reads the genealogy of a finished run.
+    """
+    # key, first parent, second parent (-1: none)
+    RECORD = struct.Struct('<qqq')
+
+    def __init__(self, path, cache_generations=1, mode='w'):
+        if mode not in ('w', 'a', 'r'):
+            raise ValueError("Unexpected genealogy log mode: {0!r}".format(mode))
+        self.path = path
+        self.mode = mode
+        self.file = None
+        self.records = 0
+        self.last_key = None
+        self.recent = RecentAncestry(cache_generations)
+
+    def resume(self, last_key, source=None):
+        """
+        Continues the genealogy of a run restored from a checkpoint whose
+        genomes have keys up to ``last_key``, and returns the first key the
+        run may give to new genomes.
+
+        If ``source``, the log of the run that saved the checkpoint, is
+        another file, this log starts with a copy of its records up to
+        ``last_key``. If it is this log (or None), this log is appended to
+        as it is, and the new genomes get keys after all of its records, so
+        that the genealogy of the later generations of the saved run is kept.
+        """
+        self.close()
+        if (source is None) or (os.path.exists(source) and os.path.exists(self.path) and
+                                os.path.samefile(source, self.path)):
+            self.mode = 'a'
+            self._open()
+            return max(last_key, -1 if self.last_key is None else self.last_key) + 1
+
+        self.mode = 'w'
+        self._open()
+        if os.path.exists(source):
+            self._copy_records(source, last_key)
+        self.mode = 'a'
+        return last_key + 1
+
+    def _copy_records(self, source, last_key):
+        """Appends the records of the genomes up to ``last_key`` in the log ``source``."""
+        log = GenealogyLog(source, mode='r')
+        try:
+            log._open()
+            remaining = log._find(last_key + 1) * self.RECORD.size
+            log.file.seek(0)
+            while remaining > 0:
+                chunk = log.file.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                self.file.write(chunk)
+                remaining -= len(chunk)
+        finally:
+            log.close()
+        self.records = self.file.tell() // self.RECORD.size
+        self.last_key = self._read(self.records - 1)[0] if self.records else None
+        self.file.seek(0, os.SEEK_END)
+
+    def _open(self):
+        if self.file is not None:
+            return
+        if self.mode == 'r':
+            self.file = open(self.path, 'rb')
+        elif (self.mode == 'a') and os.path.exists(self.path):
+            self.file = open(self.path, 'r+b')
+        else:
+            self.file = open(self.path, 'w+b')
+        self.file.seek(0, os.SEEK_END)
+        self.records = self.file.tell() // self.RECORD.size
+        self.last_key = self._read(self.records - 1)[0] if self.records else None
+
+    def next_generation(self):
+        self.recent.next_generation()
+        if self.file is not None:
+            self.file.flush()
+
+    def __setitem__(self, key, parents):
+        if self.mode == 'r':
+            raise ValueError("Genealogy log {0} is read-only".format(self.path))
+        self._open()
+        if (self.last_key is not None) and (key <= self.last_key):
+            raise ValueError("Genome keys must be logged in increasing order ({0} after {1})".format(
+                key, self.last_key))
+        padded = (tuple(parents) + (-1, -1))[:2]
+        self.file.write(self.RECORD.pack(key, padded[0], padded[1]))
+        self.records += 1
+        self.last_key = key
+        self.recent[key] = parents
+
+    def _read(self, index):
+        self.file.seek(index * self.RECORD.size)
+        record = self.RECORD.unpack(self.file.read(self.RECORD.size))
+        return record[0], tuple(p for p in record[1:] if p >= 0)
+
+    def _find(self, key):
+        """Returns the index of the first record of a key not below ``key``."""
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) // 2
+            if self._read(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, key, default=None):
+        parents = self.recent.get(key)
+        if parents is not None:
+            return parents
+
+        self._open()
+        self.file.flush()
+        try:
+            index = self._find(key)
+            if index < self.records:
+                found_key, parents = self._read(index)
+                if found_key == key:
+                    return parents
+            return default
+        finally:
+            self.file.seek(0, os.SEEK_END)
+
+    def __getitem__(self, key):
+        parents = self.get(key)
+        if parents is None:
+            raise KeyError(key)
+        return parents
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        self._open()
+        return self.records
+
+    def lineage(self, key, generations=None):
+        return lineage(self, key, generations)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -5,6 +5,7 @@ from __future__ import division, print_function
 from itertools import count
 from random import choice, random, shuffle
 
+import os
 import sys
 
 from modneat.activations import ActivationFunctionSet
@@ -13,6 +14,28 @@ from modneat.config import ConfigParameter, write_pretty_params
 from modneat.genes import DefaultConnectionGene, DefaultNodeGene, DefaultGlobalGene, ExHebbConnectionGene, ExHebbGlobalGene, ExampleGlobalGene, ModNodeGene
 from modneat.graphs import creates_cycle
 
+def _new_versions():
+    """
+    Returns the source of the version stamps of genomes (see
+    `DefaultGenome.touch`): a counter in the low 32 bits, after a random
+    prefix drawn for each process, so that stamps made by different
+    processes (including forked workers, and the runs a checkpoint is
+    restored into) do not collide. The prefix does not use `random`, whose
+    state belongs to the run.
+    """
+    prefix = int.from_bytes(os.urandom(4), 'little') >> 1
+    return count((prefix << 32) + 1)
+
+_versions = _new_versions()
+
+
+def _reset_versions():
+    global _versions  # pylint: disable=global-statement
+    _versions = _new_versions()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_versions)
+
 
 class DefaultGenomeConfig(object):
     """Sets up and holds configuration information for the DefaultGenome class."""
@@ -179,8 +202,20 @@ class DefaultGenome(object):
         self.fitness = None
         self.history = None
 
+        # Changes whenever the genes change (unique across processes).
+        self.version = next(_versions)
+
+    def touch(self):
+        """
+        Gives the genome a new version stamp, invalidating any phenotype built
+        from it (see `modneat.nn.phenotype_cache`); call this after changing
+        genes by hand. The configure and mutate methods do so themselves.
+        """
+        self.version = next(_versions)
+
     def configure_new(self, config):
         """Configure a new genome based on the given configuration."""
+        self.touch()
 
         #Create global param genes.
         self.global_params[0] = self.create_global_params(config, 0)
@@ -243,6 +278,7 @@ class DefaultGenome(object):
 
     def configure_crossover(self, genome1, genome2, config):
         """ Configure a new genome by crossover from two parent genomes. """
+        self.touch()
         if genome1.fitness > genome2.fitness:
             parent1, parent2 = genome1, genome2
         else:
@@ -277,6 +313,7 @@ class DefaultGenome(object):
 
     def mutate(self, config):
         """ Mutates this genome. """
+        self.touch()
 
         if config.single_structural_mutation:
             div = max(1, (config.node_add_prob + config.node_delete_prob +
@@ -319,6 +356,7 @@ class DefaultGenome(object):
 
 
     def mutate_add_node(self, config):
+        self.touch()
         if not self.connections:
             if config.check_structural_mutation_surer():
                 self.mutate_add_connection(config)
@@ -345,6 +383,7 @@ class DefaultGenome(object):
         assert isinstance(output_key, int)
         assert output_key >= 0
         assert isinstance(enabled, bool)
+        self.touch()
         key = (input_key, output_key)
         connection = config.connection_gene_type(key)
         connection.init_attributes(config)
@@ -357,6 +396,7 @@ class DefaultGenome(object):
         Attempt to add a new connection, the only restriction being that the output
         node cannot be one of the network input pins.
         """
+        self.touch()
         possible_outputs = list(self.nodes)
         out_node = choice(possible_outputs)
 
@@ -386,6 +426,7 @@ class DefaultGenome(object):
         self.connections[cg.key] = cg
 
     def mutate_delete_node(self, config):
+        self.touch()
         # Do nothing if there are no non-output nodes.
         available_nodes = [k for k in self.nodes if k not in config.output_keys]
         if not available_nodes:
@@ -406,6 +447,7 @@ class DefaultGenome(object):
         return del_key
 
     def mutate_delete_connection(self):
+        self.touch()
         if self.connections:
             key = choice(list(self.connections.keys()))
             del self.connections[key]
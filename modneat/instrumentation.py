@@ -0,0 +1,58 @@
+"""
+Lightweight instrumentation of a run: a timer for the phases of a generation,
+and counters of work done (networks built, distances computed, cache hits)
+which `Population` reports with the timings through the ``phase_timings``
+reporter hook.
+
+The counters are per process, so work done in the workers of a parallel
+evaluator is not counted.
+"""
+import time
+from collections import Counter
+
+# name -> number of events in this process since it started
+counters = Counter()
+
+
+def count(name, n=1):
+    """Adds ``n`` to the counter ``name``."""
+    counters[name] += n
+
+
+class _Phase(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class PhaseTimer(object):
+    """
+    Accumulates the time spent in named phases of one generation, and the
+    change of the `counters` since the timer was created.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.counters_start = counters.copy()
+
+    def phase(self, name):
+        """Returns a context manager adding the time spent in its block to the phase ``name``."""
+        return _Phase(self, name)
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def results(self):
+        """Returns the timings (in seconds, with the ``total``) and the counts of the generation."""
+        timings = dict(self.timings)
+        timings['total'] = time.perf_counter() - self.start
+        counts = dict((k, v - self.counters_start.get(k, 0)) for k, v in counters.items()
+                      if v != self.counters_start.get(k, 0))
+        return timings, counts
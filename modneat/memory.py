@@ -0,0 +1,229 @@
+"""
+Accounting of the memory held by a run: `MemoryReporter` measures how many
+bytes each part of the evolution state (genomes, their ``history`` traces,
+species and their ``fitness_history``, the ancestry records of the
+reproduction, the statistics) holds, and warns about structures that keep
+growing from one measurement to the next.
+
+Sizes are measured by walking the objects (`deep_sizeof`); objects shared by
+several parts are counted once, for the first part that reaches them.
+Optionally, `tracemalloc` traces the generations measured, to show how much
+memory their evaluation left allocated and which source lines allocated it.
+"""
+from __future__ import print_function
+
+import json
+import sys
+import tracemalloc
+import types
+from collections import deque
+
+from modneat.reporting import BaseReporter
+
+# Objects of these types are shared by the whole program, not owned by the structure being measured.
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+               types.MethodType, types.CodeType)
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), range)
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Returns the number of bytes held by ``obj`` and everything it refers to
+    (containers, instance attributes and slots). Objects whose id is in
+    ``seen`` are skipped, and the ids of those counted are added to it, so
+    that a shared ``seen`` counts every object once.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if (id(o) in seen) or isinstance(o, _SKIP_TYPES):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, _ATOMIC_TYPES):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        else:
+            attributes = getattr(o, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(o).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if hasattr(o, slot):
+                        stack.append(getattr(o, slot))
+    return size
+
+
+def format_bytes(n):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return '{0:.1f} {1}'.format(n, unit) if unit != 'B' else '{0} B'.format(n)
+        n /= 1024.0
+
+
+class MemoryReporter(BaseReporter):
+    """
+    Every ``generation_interval`` generations (after evaluation, while the
+    genomes still hold their ``history``), measures the bytes held by:
+
+    * ``histories``: the ``history`` returned by the evaluation of each genome,
+    * ``fitness_history``: the fitness histories of the species,
+    * ``genomes``: the genomes of the population (without their history),
+    * ``species``: the species and the genome-to-species map,
+    * ``ancestors``: ``reproduction.ancestors``, if ``reproduction`` is given,
+    * ``statistics``: the ``stats`` reporter (e.g. its copies of the best genomes), if given,
+
+    and any structure added with `track`. The sizes and the bytes per
+    genome are printed (if ``show`` is True) and appended as JSON to
+    ``jsonl_path`` (if given); the latest measurement is kept in ``last``.
+
+    If ``trace_allocations`` is True, `tracemalloc` is started at the
+    beginning of each generation measured and stopped once it is measured
+    (unless it was already tracing), and the measurement includes the memory
+    allocated during the generation that is still held, its peak, and the
+    ``top_allocations`` source lines that allocated most of it. Tracing
+    slows down the traced generations noticeably, so it is off by default.
+
+    A structure that has grown at each of the last ``growth_measurements``
+    measurements is reported on stderr, once until it stops growing.
+    Sizing the structures takes time proportional to their size.
+    """
+    def __init__(self, reproduction=None, stats=None, generation_interval=10, jsonl_path=None,
+                 trace_allocations=False, top_allocations=5, growth_measurements=5, show=True):
+        self.reproduction = reproduction
+        self.stats = stats
+        self.generation_interval = generation_interval
+        self.jsonl_path = jsonl_path
+        self.trace_allocations = trace_allocations
+        self.top_allocations = top_allocations
+        self.growth_measurements = growth_measurements
+        self.show = show
+        self.tracked = []
+        self.generation = None
+        self.last_generation_measured = None
+        self.last = None
+        self.sizes = {}
+        self.growing = set()
+        self.started_tracing = False
+
+    def track(self, name, getter):
+        """Adds the structure returned by ``getter()`` to the measurements, under ``name``."""
+        self.tracked.append((name, getter))
+
+    def _due(self):
+        return (self.last_generation_measured is None or
+                self.generation - self.last_generation_measured >= self.generation_interval)
+
+    def start_generation(self, generation):
+        self.generation = generation
+        if self.trace_allocations and self._due() and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if self._due():
+            self.measure(config, population, species)
+
+    def measure(self, config, population, species_set):
+        """Measures the memory held now; returns the measurement (a dict)."""
+        self.last_generation_measured = self.generation
+        genomes = list(population.values())
+        # Trace first, so that the allocations of the sizing below are not reported.
+        traced = {}
+        if self.trace_allocations and tracemalloc.is_tracing():
+            traced = self._trace()
+            if self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+
+        # Shared objects that belong to no part of the state.
+        seen = set(id(o) for o in (self, config, species_set.reporters))
+        sizes = {}
+        sizes['histories'] = sum(deep_sizeof(getattr(g, 'history', None), seen) for g in genomes)
+        sizes['fitness_history'] = sum(deep_sizeof(s.fitness_history, seen)
+                                       for s in species_set.species.values())
+
+        largest_genome, largest_genome_size = None, 0
+        seen.add(id(population))
+        sizes['genomes'] = sys.getsizeof(population)
+        for g in genomes:
+            size = deep_sizeof(g, seen)
+            sizes['genomes'] += size
+            if size > largest_genome_size:
+                largest_genome, largest_genome_size = g.key, size
+
+        sizes['species'] = (deep_sizeof(species_set.species, seen) +
+                            deep_sizeof(species_set.genome_to_species, seen))
+        if self.reproduction is not None:
+            sizes['ancestors'] = deep_sizeof(self.reproduction.ancestors, seen)
+        if self.stats is not None:
+            sizes['statistics'] = deep_sizeof(self.stats, seen)
+        for name, getter in self.tracked:
+            sizes[name] = deep_sizeof(getter(), seen)
+
+        measurement = {'generation': self.generation,
+                       'sizes': sizes,
+                       'population_size': len(genomes),
+                       'genome_bytes_mean': sizes['genomes'] // max(1, len(genomes)),
+                       'history_bytes_mean': sizes['histories'] // max(1, len(genomes)),
+                       'largest_genome': largest_genome,
+                       'largest_genome_bytes': largest_genome_size}
+        measurement.update(traced)
+
+        self._check_growth(sizes)
+        self.last = measurement
+        if self.show:
+            self._print(measurement)
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(measurement) + '\n')
+        return measurement
+
+    def _trace(self):
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+        top = []
+        for stat in snapshot.statistics('lineno')[:self.top_allocations]:
+            frame = stat.traceback[0]
+            top.append({'location': '{0}:{1}'.format(frame.filename, frame.lineno),
+                        'bytes': stat.size, 'blocks': stat.count})
+        return {'traced_bytes': current, 'traced_peak_bytes': peak, 'top_allocations': top}
+
+    def _check_growth(self, sizes):
+        for name, size in sizes.items():
+            history = self.sizes.setdefault(name, deque(maxlen=self.growth_measurements + 1))
+            history.append(size)
+            values = list(history)
+            growing = (len(values) == history.maxlen and
+                       all(a < b for a, b in zip(values, values[1:])))
+            if growing and name not in self.growing:
+                print('Warning: {0} has grown at each of the last {1} memory measurements ({2} -> {3})'.format(
+                    name, self.growth_measurements, format_bytes(values[0]), format_bytes(values[-1])),
+                      file=sys.stderr)
+            if growing:
+                self.growing.add(name)
+            else:
+                self.growing.discard(name)
+
+    @staticmethod
+    def _print(measurement):
+        sizes = measurement['sizes']
+        print(' Memory: ' + ', '.join('{0} {1}'.format(name, format_bytes(sizes[name])) for name in sorted(sizes)))
+        print(' Memory per genome: {0} (history {1}); largest genome {2} ({3})'.format(
+            format_bytes(measurement['genome_bytes_mean']), format_bytes(measurement['history_bytes_mean']),
+            measurement['largest_genome'], format_bytes(measurement['largest_genome_bytes'])))
+        if 'traced_bytes' in measurement:
+            print(' Memory allocated during the generation: {0} (peak {1})'.format(
+                format_bytes(measurement['traced_bytes']), format_bytes(measurement['traced_peak_bytes'])))
+            for allocation in measurement['top_allocations']:
+                print('   {0:>10} {1}'.format(format_bytes(allocation['bytes']), allocation['location']))
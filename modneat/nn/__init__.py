@@ -3,4 +3,5 @@ from modneat.nn.recurrent import Recurrent
 from modneat.nn.mod_feed_forward import ModFeedForward
 from modneat.nn.mod_recurrent import ModRecurrent
 from modneat.nn.mod_index_hebb_ffn import ModIndExHebbFFN
-from modneat.nn import utils
\ No newline at end of file
+from modneat.nn import utils
+from modneat.nn.phenotype_cache import PhenotypeCache, phenotype_cache
\ No newline at end of file
@@ -1,6 +1,7 @@
 import copy
 from modneat.graphs import feed_forward_layers
 from modneat.genome import DefaultGenome
+from modneat.nn.phenotype_cache import cached
 
 class FeedForward(object):
     def __init__(self, inputs, outputs, node_evals):
@@ -34,6 +35,7 @@ class FeedForward(object):
         return [self.values[i] for i in self.output_nodes]
 
     @staticmethod
+    @cached
     def create(genome, config):
         """ Receives a genome and returns its phenotype (a FeedForwardNetwork). """
 
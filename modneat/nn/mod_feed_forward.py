@@ -4,6 +4,7 @@ from modneat.graphs import feed_forward_layers
 from modneat.genome import ModGenome
 from modneat.nn import FeedForward
 from modneat.nn.utils import weight_change
+from modneat.nn.phenotype_cache import cached
 
 class ModFeedForward(FeedForward):
     def __init__(self, inputs, outputs, node_evals, global_params, config):
@@ -83,6 +84,7 @@ class ModFeedForward(FeedForward):
         return [self.values[i] for i in self.output_nodes]
 
     @staticmethod
+    @cached
     def create(genome, config):
         """ Receives a genome and returns its phenotype (a FeedForwardNetwork). """
 
@@ -3,6 +3,7 @@ import math
 from modneat.graphs import feed_forward_layers
 #from modneat.genome import ModIndExHebbGenome
 from modneat.nn.utils import weight_change
+from modneat.nn.phenotype_cache import cached
 
 def sigmoid(a):
     try: #HACK: overflow対策
@@ -70,6 +71,7 @@ class ModIndExHebbFFN(object):
         return [self.values[i] for i in self.output_nodes]
 
     @staticmethod
+    @cached
     def create(genome, config):
         """ Receives a genome and returns its phenotype (a FeedForwardNetwork). """
 
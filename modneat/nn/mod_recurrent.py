@@ -4,6 +4,7 @@ from modneat.graphs import required_for_output
 from modneat.genome import ModGenome
 from modneat.nn import Recurrent
 from modneat.nn.utils import weight_change
+from modneat.nn.phenotype_cache import cached
 
 class ModRecurrent:
     def __init__(self, inputs, outputs, node_evals, global_params, config):
@@ -111,6 +112,7 @@ class ModRecurrent:
         return [ovalues[i] for i in self.output_nodes]
 
     @staticmethod
+    @cached
     def create(genome, config):
         """ Receives a genome and returns its phenotype (a RecurrentNetwork). """
         genome_config = config.genome_config
@@ -0,0 +1,106 @@
+"""
+Caches the networks built from genomes, so that genomes evaluated again
+without having changed (most often elites carried over by reproduction)
+are not rebuilt every generation.
+"""
+import copy
+import functools
+import itertools
+import weakref
+from collections import OrderedDict
+
+from modneat import instrumentation
+
+# Identities of the configs which are not snapshots; see `config_identity`.
+_config_identities = weakref.WeakKeyDictionary()
+_config_counter = itertools.count()
+
+
+def config_identity(config):
+    """
+    Returns what identifies ``config`` in the keys of the cache: the digest
+    of a `modneat.config.ConfigSnapshot` (the same in every process), or
+    else a token given to the config object for as long as it lives (unlike
+    its ``id``, never reused by another config).
+    """
+    digest = getattr(config, 'digest', None)
+    if digest is not None:
+        return digest
+    identity = _config_identities.get(config)
+    if identity is None:
+        identity = _config_identities[config] = next(_config_counter)
+    return identity
+
+
+class PhenotypeCache(object):
+    """
+    A bounded (least recently used) cache of networks, keyed by the network
+    type, the genome key, the genome's version stamp, which changes
+    whenever the genome is configured or mutated (see `DefaultGenome.touch`),
+    and the config (see `config_identity`).
+
+    A network is only kept once the same genome is asked for a second time,
+    since most genomes are built just once. Every hit returns a deep copy of
+    the cached network, sharing only the config: all the networks of
+    `modneat.nn` keep state while they are evaluated (node values, and the
+    weights of ``node_evals`` changed by plasticity), so a network handed out
+    twice would start its second evaluation from the end of the first, and
+    threads evaluating the same genome would share it. Copying is still much
+    cheaper than building the network. Each process (e.g. every worker of a
+    ParallelEvaluator) has its own cache. Set ``max_entries`` to 0 to
+    disable caching.
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.networks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.networks.clear()
+
+    def create(self, build, genome, config):
+        """Returns a network for the genome, calling ``build(genome, config)`` on a miss."""
+        version = getattr(genome, 'version', None)
+        if (not self.max_entries) or (version is None):
+            instrumentation.count('networks_built')
+            return build(genome, config)
+
+        key = (build.__module__, build.__qualname__, genome.key, version, config_identity(config))
+        if key not in self.networks:
+            # Most genomes are built only once, so they are not copied.
+            self.misses += 1
+            instrumentation.count('networks_built')
+            self._store(key, None)
+            return build(genome, config)
+
+        net = self.networks[key]
+        if net is None:
+            self.misses += 1
+            instrumentation.count('networks_built')
+            net = build(genome, config)
+            self._store(key, copy.deepcopy(net, {id(config): config}))
+            return net
+
+        self.hits += 1
+        instrumentation.count('phenotype_cache_hits')
+        self.networks.move_to_end(key)
+        # A copy, since the network's state changes while it is evaluated (see above).
+        return copy.deepcopy(net, {id(config): config})
+
+    def _store(self, key, net):
+        self.networks[key] = net
+        self.networks.move_to_end(key)
+        while len(self.networks) > self.max_entries:
+            self.networks.popitem(last=False)
+
+# The cache used by the ``create`` methods of the networks in `modneat.nn`.
+phenotype_cache = PhenotypeCache()
+
+
+def cached(build):
+    """Decorates the ``create`` function of a network type to go through `phenotype_cache`."""
+    @functools.wraps(build)
+    def create(genome, config):
+        return phenotype_cache.create(build, genome, config)
+    return create
@@ -1,5 +1,6 @@
 from modneat.graphs import required_for_output
 from modneat.genome import DefaultGenome
+from modneat.nn.phenotype_cache import cached
 
 class Recurrent(object):
     def __init__(self, inputs, outputs, node_evals):
@@ -46,6 +47,7 @@ class Recurrent(object):
         return [ovalues[i] for i in self.output_nodes]
 
     @staticmethod
+    @cached
     def create(genome, config):
         """ Receives a genome and returns its phenotype (a RecurrentNetwork). """
         genome_config = config.genome_config
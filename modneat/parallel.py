@@ -2,30 +2,305 @@
 Runs evaluation functions in parallel subprocesses
 in order to evaluate multiple genomes at once.
 """
+from __future__ import print_function
+
+import queue
+import sys
+import time
+import multiprocessing
+from itertools import count
 from multiprocessing import Pool
 
+from modneat.profiling import ProfileMerger, profiled_call
+
+# How often (in seconds) the evaluator looks for jobs that workers have started, while it waits.
+_POLL_INTERVAL = 0.05
+
+# Set in each worker to the queue on which it reports the jobs it starts (if there is a timeout).
+_started_queue = None
+
+
+def _init_worker(started_queue):
+    global _started_queue # pylint: disable=global-statement
+    _started_queue = started_queue
+    # Do not keep a worker from exiting because nobody read its last reports.
+    started_queue.cancel_join_thread()
+
+
+def _run_job(token, eval_function, genome, config, profiled):
+    """Runs one evaluation in a worker, first reporting when it started."""
+    if _started_queue is not None:
+        _started_queue.put((token, time.time()))
+    if profiled:
+        return profiled_call(eval_function, genome, config)
+    return eval_function(genome, config)
+
+
+class _EvaluationJob(object):
+    """Keeps track of one genome evaluation, so that it can be re-submitted."""
+    def __init__(self, genome, config):
+        self.genome = genome
+        self.config = config
+        self.result = None
+        self.attempts = 0
+        self.profiled = False
+        # The current attempt, and when a worker started running it (None while it is queued).
+        self.token = None
+        self.started = None
+        # A pool of one worker of its own, once the job has hung.
+        self.own_pool = None
+        # The error of the last attempt, once the job has run out of retries.
+        self.error = None
+
 
 class ParallelEvaluator(object):
-    def __init__(self, num_workers, eval_function, timeout=None):
+    def __init__(self, num_workers, eval_function, timeout=None, fallback_fitness=None,
+                 max_retries=0, maxtasksperchild=None, profile_every=0):
         """
         eval_function should take one argument, a tuple of
         (genome object, config object), and return
         a single float (the genome's fitness).
+
+        ``timeout`` is the number of seconds the evaluation of a genome may
+        take, counted from when a worker starts running it (None waits
+        forever); time spent queued behind other genomes does not count.
+        A genome whose evaluation times out or raises an exception is
+        re-submitted up to ``max_retries`` times.  After that, it is given
+        ``fallback_fitness``; if ``fallback_fitness`` is None, the error is
+        raised instead, which ends the run.
+
+        While the evaluator waits for a result, the timeouts and errors of all
+        the running genomes are checked, not only of the one waited for.
+        Workers that hang are abandoned, and the genome they were evaluating
+        is retried in a new worker of its own; once no healthy worker is left,
+        the pool is replaced and the outstanding jobs are re-submitted to the
+        new one.  ``maxtasksperchild`` is passed to `multiprocessing.Pool`, so that
+        each worker is replaced after that many evaluations; this bounds the
+        memory leaked by an evaluation function during long runs.
+
+        If ``profile_every`` is positive, every ``profile_every``-th genome
+        submitted is evaluated under `cProfile` in its worker, and the merged
+        statistics can be fetched with `take_profile` (e.g. by a
+        `modneat.profiling.ProfileReporter`).
+
+        The genomes are sent to the workers with a `ConfigSnapshot` of the
+        config (see `Config.snapshot`) in place of the config itself, taken
+        when the config is first submitted and again at every `evaluate`.
+        A snapshot is cheap to send, and each worker keeps one copy of it for
+        all its jobs.
+
+        The evaluator can be used as a context manager, which closes the pool
+        on exit; otherwise call `close` (or `terminate`) explicitly.
         """
         self.num_workers = num_workers
         self.eval_function = eval_function
         self.timeout = timeout
-        self.pool = Pool(num_workers)
+        self.fallback_fitness = fallback_fitness
+        self.max_retries = max_retries
+        self.maxtasksperchild = maxtasksperchild
+        self.profile_every = profile_every
+        self.num_submitted = 0
+        self.profile = ProfileMerger()
+        self.num_hung = 0
+        self.jobs = set()
+        self.config = None
+        self.config_snapshot = None
+        # Attempts are numbered, so that reports of abandoned attempts can be told apart.
+        self.tokens = count()
+        self.running = {}
+        self.started_queue = multiprocessing.Queue() if timeout is not None else None
+        self.pool = self._new_pool(num_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
 
     def __del__(self):
-        self.pool.close() # should this be terminate?
+        if getattr(self, 'pool', None) is not None:
+            self.terminate()
+
+    def close(self):
+        """Waits for the workers to finish their current tasks and stops them."""
+        self._stop_own_pools()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def terminate(self):
+        """Stops the workers immediately."""
+        self._stop_own_pools()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def _new_pool(self, num_workers):
+        if self.started_queue is None:
+            return Pool(num_workers, maxtasksperchild=self.maxtasksperchild)
+        return Pool(num_workers, initializer=_init_worker, initargs=(self.started_queue,),
+                    maxtasksperchild=self.maxtasksperchild)
+
+    @staticmethod
+    def _stop_own_pool(job):
+        if job.own_pool is not None:
+            job.own_pool.terminate()
+            job.own_pool.join()
+            job.own_pool = None
+
+    def _stop_own_pools(self):
+        for job in getattr(self, 'jobs', ()):
+            self._stop_own_pool(job)
+
+    def _start(self, job, fresh_worker=False):
+        """Starts a new attempt of the job, in a new worker of its own if ``fresh_worker`` is True."""
+        if self.pool is None:
+            raise RuntimeError("ParallelEvaluator is closed")
+        if fresh_worker:
+            self._stop_own_pool(job)
+            job.own_pool = self._new_pool(1)
+        self.running.pop(job.token, None)
+        job.token = next(self.tokens)
+        job.started = None
+        self.running[job.token] = job
+        pool = job.own_pool if job.own_pool is not None else self.pool
+        job.result = pool.apply_async(_run_job, (job.token, self.eval_function, job.genome, job.config,
+                                                 job.profiled))
+
+    def _restart_pool(self):
+        """Replaces the pool (and any hung workers in it), re-submitting outstanding jobs."""
+        self.pool.terminate()
         self.pool.join()
+        self.pool = self._new_pool(self.num_workers)
+        self.num_hung = 0
+        for job in self.jobs:
+            if (job.own_pool is None) and (job.error is None) and not job.result.ready():
+                self._start(job)
+
+    def _read_started(self):
+        """Notes the start time of the jobs that workers reported having started."""
+        while True:
+            try:
+                token, started = self.started_queue.get_nowait()
+            except queue.Empty:
+                return
+            job = self.running.get(token)
+            if job is not None:
+                job.started = started
+
+    def _abandon(self, job, error, hung):
+        """
+        Ends the current attempt of the job, which raised ``error`` or (if
+        ``hung``) timed out: starts another attempt, or records the error in
+        the job once it has run out of retries.
+        """
+        if hung and (job.own_pool is None):
+            # The worker running this job is stuck; it is not available anymore.
+            self.num_hung += 1
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self.running.pop(job.token, None)
+            self._stop_own_pool(job)
+            job.error = error
+        elif hung:
+            # Retry in a new worker rather than behind the genomes still queued.
+            self._start(job, fresh_worker=True)
+        else:
+            self._start(job)
+
+    def _check_running(self):
+        """
+        Abandons the running attempts that failed or have run for longer than
+        the timeout, and replaces the pool once no healthy worker is left.
+        """
+        self._read_started()
+        now = time.time()
+        for job in list(self.running.values()):
+            if job.result.ready():
+                if not job.result.successful():
+                    try:
+                        job.result.get()
+                    except Exception as e: # pylint: disable=broad-except
+                        self._abandon(job, e, hung=False)
+            elif (job.started is not None) and (now - job.started >= self.timeout):
+                self._abandon(job, multiprocessing.TimeoutError(), hung=True)
+        if self.num_hung >= self.num_workers:
+            self._restart_pool()
+
+    def _wait(self, job):
+        """Waits until the current attempt of the job is done, or the job has run out of retries."""
+        if self.timeout is None:
+            job.result.wait()
+            return
+        while (job.error is None) and not job.result.ready():
+            self._check_running()
+            if job.error is None:
+                job.result.wait(_POLL_INTERVAL)
+
+    def _snapshot(self, config):
+        if config is not self.config:
+            self.config = config
+            # Configs without snapshots (e.g. written by users) are sent as they are.
+            self.config_snapshot = config.snapshot() if hasattr(config, 'snapshot') else config
+        return self.config_snapshot
+
+    def submit(self, genome, config):
+        """Starts evaluating a single genome; used by `Population.run_pipelined`."""
+        job = _EvaluationJob(genome, self._snapshot(config))
+        job.profiled = (self.profile_every > 0) and (self.num_submitted % self.profile_every == 0)
+        self.num_submitted += 1
+        self._start(job)
+        self.jobs.add(job)
+        return job
+
+    def collect(self, job, genome):
+        """Waits for a job returned by `submit` and assigns its result to the genome."""
+        try:
+            while True:
+                self._wait(job)
+                if job.error is not None:
+                    if self.fallback_fitness is None:
+                        raise job.error
+                    print("Evaluation of genome {0} failed ({1!r}); using fallback fitness {2}".format(
+                        genome.key, job.error, self.fallback_fitness), file=sys.stderr)
+                    genome.fitness, genome.history = self.fallback_fitness, None
+                    break
+                try:
+                    result = job.result.get()
+                except Exception as e: # pylint: disable=broad-except
+                    self._abandon(job, e, hung=False)
+                    continue
+                if job.profiled:
+                    result, raw_stats = result
+                    self.profile.add(raw_stats)
+                genome.fitness, genome.history = result
+                break
+        finally:
+            self.running.pop(job.token, None)
+            self._stop_own_pool(job)
+            self.jobs.discard(job)
+
+    def take_profile(self):
+        """Returns the `ProfileMerger` of the evaluations profiled since the last call, and starts a new one."""
+        profile, self.profile = self.profile, ProfileMerger()
+        return profile
 
     def evaluate(self, genomes, config):
+        # Take a new snapshot, in case the config was changed since the last generation.
+        self.config = None
         jobs = []
         for ignored_genome_id, genome in genomes:
-            jobs.append(self.pool.apply_async(self.eval_function, (genome, config)))
+            jobs.append(self.submit(genome, config))
 
         # assign the fitness back to each genome
         for job, (ignored_genome_id, genome) in zip(jobs, genomes):
-            genome.fitness, genome.history = job.get(timeout=self.timeout)
+            self.collect(job, genome)
+
+        # Replace workers that are still stuck on abandoned evaluations.
+        if self.num_hung and not self.jobs:
+            self._restart_pool()
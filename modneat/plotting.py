@@ -0,0 +1,193 @@
+"""
+Renders the fitness and speciation figures of a run from its statistics
+files, either periodically during the run (`PlotReporter`, optionally in a
+background process) or afterwards (`render_reports`, used by
+``create_reports.py``).
+
+`modneat.visualize` (and with it matplotlib and graphviz) is only imported
+when a figure is actually drawn.
+"""
+from __future__ import print_function
+
+import atexit
+import copy
+import csv
+import os
+import pickle
+from concurrent import futures
+
+from modneat.reporting import BaseReporter
+
+FITNESS_FILE = 'fitness_history.csv'
+STDEV_FILE = 'fitness_stdev.csv'
+SPECIATION_FILE = 'speciation.csv'
+SPECIES_FITNESS_FILE = 'species_fitness.csv'
+
+
+def save_statistics(stats, directory):
+    """Writes the statistics files of a `StatisticsReporter` to ``directory``."""
+    stats.save_genome_fitness(filename=os.path.join(directory, FITNESS_FILE))
+    stats.save_fitness_stdev(filename=os.path.join(directory, STDEV_FILE))
+    stats.save_species_count(filename=os.path.join(directory, SPECIATION_FILE))
+    stats.save_species_fitness(filename=os.path.join(directory, SPECIES_FITNESS_FILE))
+
+
+def _statistics_rows(stats):
+    """Returns the rows of the statistics files of a `StatisticsReporter` (see `save_statistics`)."""
+    fitness = [list(row) for row in zip(stats.get_fitness_best(), stats.get_fitness_mean())]
+    return {FITNESS_FILE: fitness,
+            STDEV_FILE: [[sd] for sd in stats.get_fitness_stdev()],
+            SPECIATION_FILE: stats.get_species_sizes(),
+            SPECIES_FITNESS_FILE: stats.get_species_fitness('NA')}
+
+
+def _write_rows(filename, rows, delimiter=' '):
+    with open(filename, 'w') as f:
+        w = csv.writer(f, delimiter=delimiter)
+        for row in rows:
+            w.writerow(row)
+
+
+def _read_rows(filename, delimiter=' '):
+    with open(filename) as f:
+        return [[float(v) for v in row] for row in csv.reader(f, delimiter=delimiter)]
+
+
+def render_reports(directory, output_directory=None, view=False):
+    """
+    Draws ``avg_fitness.png`` and ``speciation.png`` from the statistics files
+    in ``directory`` (see `save_statistics`) into ``output_directory``
+    (default: ``directory``). Returns the names of the figures drawn.
+    """
+    from modneat import visualize
+
+    if output_directory is None:
+        output_directory = directory
+    drawn = []
+
+    fitness_file = os.path.join(directory, FITNESS_FILE)
+    if os.path.isfile(fitness_file):
+        rows = _read_rows(fitness_file)
+        best = [row[0] for row in rows]
+        avg = [row[1] for row in rows]
+        # The standard deviation is in a file of its own (or, in some older files, a third column).
+        stdev_file = os.path.join(directory, STDEV_FILE)
+        if os.path.isfile(stdev_file):
+            sd = [row[0] for row in _read_rows(stdev_file, delimiter=',')]
+        else:
+            sd = [row[2] if len(row) > 2 else 0.0 for row in rows]
+        filename = os.path.join(output_directory, 'avg_fitness.png')
+        visualize.plot_fitness(best, avg, sd, ylog=False, view=view, filename=filename)
+        drawn.append(filename)
+
+    speciation_file = os.path.join(directory, SPECIATION_FILE)
+    if os.path.isfile(speciation_file):
+        sizes = _read_rows(speciation_file)
+        filename = os.path.join(output_directory, 'speciation.png')
+        visualize.plot_species_sizes(sizes, view=view, filename=filename)
+        drawn.append(filename)
+
+    return drawn
+
+
+def _plot(savedir, rows, render, config, best_genome, generation):
+    """Writes the statistics files and draws the figures of a `PlotReporter`."""
+    for name, file_rows in rows.items():
+        _write_rows(os.path.join(savedir, name), file_rows)
+    if not render:
+        return
+
+    render_reports(savedir)
+    if best_genome is not None:
+        from modneat import visualize
+        visualize.draw_net(config, best_genome, directory=savedir+'/bests',
+                           filename='best_{0}'.format(generation), show_disabled=False)
+
+
+def _plot_snapshot(snapshot):
+    """Runs `_plot` in the background process of a `PlotReporter` (the arguments are pickled)."""
+    _plot(*pickle.loads(snapshot))
+
+
+class PlotReporter(BaseReporter):
+    """
+    Saves the statistics gathered by a `StatisticsReporter` to ``savedir``
+    every ``generation_interval`` generations and, if ``render`` is True,
+    draws the fitness and speciation figures and the network of the best
+    genome (into ``savedir/bests``) from them.
+
+    With ``render=False`` only the statistics files are written; the figures
+    can then be drawn on demand with ``create_reports.py --plots``.
+    Add this reporter after the `StatisticsReporter` it reads.
+
+    If ``background`` is True, only the rows of the statistics files and the
+    best genome (without its history) are copied during the generation; the
+    files are written and the figures drawn by a background process, as the
+    checkpoints of `modneat.checkpoint.Checkpointer`. At most
+    ``max_pending`` updates are queued; a further update waits for the
+    oldest one. Call `close` once the run is over; this is also done at exit.
+    """
+    def __init__(self, savedir, stats, generation_interval=10, render=True, draw_best=True,
+                 background=False, max_pending=1):
+        self.savedir = savedir
+        self.stats = stats
+        self.generation_interval = generation_interval
+        self.render = render
+        self.draw_best = draw_best
+        self.background = background
+        self.max_pending = max_pending
+        self.executor = None
+        self.pending = []
+        self.current_generation = None
+        self.last_generation_rendered = None
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if (self.last_generation_rendered is None or
+                self.current_generation - self.last_generation_rendered >= self.generation_interval):
+            self.update(config, best_genome)
+
+    def found_solution(self, config, generation, best):
+        self.flush()
+
+    def update(self, config, best_genome=None):
+        """Saves the statistics and draws the figures now (or queues them, in background mode)."""
+        self.last_generation_rendered = self.current_generation
+        if not (self.render and self.draw_best):
+            best_genome = None
+        if not self.background:
+            _plot(self.savedir, _statistics_rows(self.stats), self.render, config, best_genome,
+                  self.current_generation)
+            return
+
+        if best_genome is not None:
+            # The history of the genome (which holds copies of the network) is not needed to draw it.
+            genome = copy.copy(best_genome)
+            genome.__dict__ = dict((k, v) for k, v in best_genome.__dict__.items() if k != 'history')
+            best_genome = genome
+        snapshot = pickle.dumps((self.savedir, _statistics_rows(self.stats), self.render, config,
+                                 best_genome, self.current_generation),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        if self.executor is None:
+            self.executor = futures.ProcessPoolExecutor(max_workers=1)
+            atexit.register(self.close)
+        while len(self.pending) >= self.max_pending:
+            self.pending.pop(0).result()
+        self.pending.append(self.executor.submit(_plot_snapshot, snapshot))
+
+    def flush(self):
+        """Waits until the queued updates are done; raises the first error of the background process."""
+        pending, self.pending = self.pending, []
+        for job in pending:
+            job.result()
+
+    def close(self):
+        """Finishes the queued updates and stops the background process."""
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
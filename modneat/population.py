@@ -1,6 +1,7 @@
 """Implements the core evolution algorithm."""
 from __future__ import print_function
 
+from modneat.instrumentation import PhaseTimer
 from modneat.math_util import mean
 from modneat.reporting import ReporterSet
 
@@ -19,13 +20,22 @@ class Population(object):
         5. Go to 1.
     """
 
-    def __init__(self, config, initial_state=None):
+    def __init__(self, config, initial_state=None, savedir=None, restored_from=None):
+        """
+        ``savedir`` is the directory of the run, where the reproduction may
+        write files (e.g. its genealogy log, see `modneat.genealogy`). For a
+        run restored from a checkpoint (``initial_state``), ``restored_from``
+        is the directory of the run that saved it, whose files the
+        reproduction may continue.
+        """
         self.reporters = ReporterSet()
         self.config = config
         stagnation = config.stagnation_type(config.stagnation_config, self.reporters)
         self.reproduction = config.reproduction_type(config.reproduction_config,
                                                      self.reporters,
                                                      stagnation)
+        if (savedir is not None) and hasattr(self.reproduction, 'set_directory'):
+            self.reproduction.set_directory(savedir)
         if config.fitness_criterion == 'max':
             self.fitness_criterion = max
         elif config.fitness_criterion == 'min':
@@ -46,6 +56,8 @@ class Population(object):
             self.species.speciate(config, self.population, self.generation)
         else:
             self.population, self.species, self.generation = initial_state
+            if hasattr(self.reproduction, 'resume'):
+                self.reproduction.resume(self.population, restored_from)
 
         self.best_genome = None
 
@@ -64,6 +76,11 @@ class Population(object):
             1. The population as a list of (genome id, genome) tuples.
             2. The current configuration object.
 
+        At the end of every generation, the reporters' ``phase_timings`` hook
+        receives the seconds spent in evaluation, statistics, reproduction,
+        speciation and in the reporters themselves, and the counts of
+        `modneat.instrumentation` (networks built, distances computed, ...).
+
         The return value of the fitness function is ignored, but it must assign
         a Python float to the `fitness` member of each genome.
 
@@ -81,13 +98,122 @@ class Population(object):
         k = 0
         while n is None or k < n:
             k += 1
+            timer = PhaseTimer()
 
-            self.reporters.start_generation(self.generation)
+            with timer.phase('reporters'):
+                self.reporters.start_generation(self.generation)
 
             # Evaluate all genomes using the user-provided function.
-            fitness_function(list(self.population.items()), self.config)
+            with timer.phase('evaluation'):
+                fitness_function(list(self.population.items()), self.config)
+
+            if self._report_evaluation(timer):
+                self._report_timings(timer)
+                break
+
+            # Create the next generation from the current generation.
+            with timer.phase('reproduction'):
+                self.population = self.reproduction.reproduce(self.config, self.species,
+                                                              self.config.pop_size, self.generation)
+                self._check_extinction()
+
+            # Divide the new population into species.
+            with timer.phase('speciation'):
+                self.species.speciate(self.config, self.population, self.generation)
+
+            with timer.phase('reporters'):
+                self.reporters.end_generation(self.config, self.population, self.species)
+            self._report_timings(timer)
+
+            self.generation += 1
+
+        if self.config.no_fitness_termination:
+            self.reporters.found_solution(self.config, self.generation, self.best_genome)
 
-            # Gather and report statistics.
+        return self.best_genome
+
+    def run_pipelined(self, evaluator, n=None):
+        """
+        Runs NEAT's genetic algorithm like `run`, but overlaps the creation of
+        the next generation with its evaluation.
+
+        ``evaluator`` must provide two methods (see `ParallelEvaluator`):
+            submit(genome, config): starts the evaluation of one genome in the
+                background and returns a job handle.
+            collect(job, genome): waits for the job and assigns the results
+                (fitness, etc.) to the genome.
+
+        Each member of the next generation is submitted as soon as
+        `reproduce` has created it, so the workers are already busy while the
+        rest of the offspring are being created and while the new population
+        is speciated.  Only one generation is ever in flight, and all random
+        numbers are still drawn in the primary process in the same order as in
+        `run`; as long as the evaluation itself does not depend on the
+        primary's random state, a run with a given seed produces the same
+        results as a generational run.
+        """
+
+        if self.config.no_fitness_termination and (n is None):
+            raise RuntimeError("Cannot have no generational limit with no fitness termination")
+
+        jobs = {}
+
+        def submit(genome_id, genome):
+            jobs[genome_id] = evaluator.submit(genome, self.config)
+
+        k = 0
+        while n is None or k < n:
+            k += 1
+            timer = PhaseTimer()
+
+            with timer.phase('reporters'):
+                self.reporters.start_generation(self.generation)
+
+            with timer.phase('evaluation'):
+                # Submit whatever was not dispatched during reproduction
+                # (the initial population, or a population reset after extinction).
+                for genome_id, genome in self.population.items():
+                    if genome_id not in jobs:
+                        submit(genome_id, genome)
+
+                # Wait for the whole generation to be evaluated.
+                for genome_id, genome in self.population.items():
+                    evaluator.collect(jobs.pop(genome_id), genome)
+
+            if self._report_evaluation(timer):
+                self._report_timings(timer)
+                break
+
+            # Create the next generation, dispatching each member for
+            # evaluation as soon as it exists.
+            with timer.phase('reproduction'):
+                self.population = self.reproduction.reproduce(self.config, self.species,
+                                                              self.config.pop_size, self.generation,
+                                                              spawn_callback=submit)
+                if self._check_extinction():
+                    jobs.clear()
+
+            # Divide the new population into species while it is being evaluated.
+            with timer.phase('speciation'):
+                self.species.speciate(self.config, self.population, self.generation)
+
+            with timer.phase('reporters'):
+                self.reporters.end_generation(self.config, self.population, self.species)
+            self._report_timings(timer)
+
+            self.generation += 1
+
+        if self.config.no_fitness_termination:
+            self.reporters.found_solution(self.config, self.generation, self.best_genome)
+
+        return self.best_genome
+
+    def _report_evaluation(self, timer):
+        """
+        Gathers and reports statistics after the population has been evaluated.
+        Returns True if the fitness threshold has been reached.
+        """
+        with timer.phase('statistics'):
             best = None
             for g in self.population.values():
                 if g.fitness is None:
@@ -95,44 +221,47 @@ class Population(object):
 
                 if best is None or g.fitness > best.fitness:
                     best = g
+        with timer.phase('reporters'):
             self.reporters.post_evaluate(self.config, self.population, self.species, best)
 
+        with timer.phase('statistics'):
             # Track the best genome ever seen.
             if self.best_genome is None or best.fitness > self.best_genome.fitness:
                 self.best_genome = best
 
+            solved = False
             if not self.config.no_fitness_termination:
                 # End if the fitness threshold is reached.
                 fv = self.fitness_criterion(g.fitness for g in self.population.values())
-                if fv >= self.config.fitness_threshold:
-                    self.reporters.found_solution(self.config, self.generation, best)
-                    break
+                solved = fv >= self.config.fitness_threshold
 
-            # Create the next generation from the current generation.
-            self.population = self.reproduction.reproduce(self.config, self.species,
-                                                          self.config.pop_size, self.generation)
-
-            # Check for complete extinction.
-            if not self.species.species:
-                self.reporters.complete_extinction()
-
-                # If requested by the user, create a completely new population,
-                # otherwise raise an exception.
-                if self.config.reset_on_extinction:
-                    self.population = self.reproduction.create_new(self.config.genome_type,
-                                                                   self.config.genome_config,
-                                                                   self.config.pop_size)
-                else:
-                    raise CompleteExtinctionException()
+        if solved:
+            with timer.phase('reporters'):
+                self.reporters.found_solution(self.config, self.generation, best)
+        return solved
 
-            # Divide the new population into species.
-            self.species.speciate(self.config, self.population, self.generation)
+    def _report_timings(self, timer):
+        """Sends the time spent in each phase of the generation, and the counts of work done, to the reporters."""
+        timings, counts = timer.results()
+        self.reporters.phase_timings(self.generation, timings, counts)
 
-            self.reporters.end_generation(self.config, self.population, self.species)
+    def _check_extinction(self):
+        """
+        Checks for complete extinction after reproduction.
+        Returns True if a completely new population had to be created.
+        """
+        if self.species.species:
+            return False
 
-            self.generation += 1
+        self.reporters.complete_extinction()
 
-        if self.config.no_fitness_termination:
-            self.reporters.found_solution(self.config, self.generation, self.best_genome)
+        # If requested by the user, create a completely new population,
+        # otherwise raise an exception.
+        if self.config.reset_on_extinction:
+            self.population = self.reproduction.create_new(self.config.genome_type,
+                                                           self.config.genome_config,
+                                                           self.config.pop_size)
+        else:
+            raise CompleteExtinctionException()
 
-        return self.best_genome
+        return True
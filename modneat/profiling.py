@@ -0,0 +1,84 @@
+"""
+Profiles evaluations inside the workers of a `ParallelEvaluator` (see its
+``profile_every`` argument) and writes a summary of every generation.
+
+The profiled evaluations run under `cProfile` in the worker; the raw
+statistics are sent back with the result and merged in the primary, where
+`ProfileReporter` writes them out. This shows how the evaluation time is
+split between building networks (``create``), ``activate``, plasticity
+(``weight_change``) and the task itself.
+"""
+from __future__ import print_function
+
+import cProfile
+import io
+import os
+import pstats
+
+from modneat.reporting import BaseReporter
+
+
+class _ProfileData(object):
+    """Holds raw profile statistics in the form `pstats.Stats` accepts in place of a profiler."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profiled_call(eval_function, genome, config):
+    """Runs ``eval_function(genome, config)`` under `cProfile`; returns its result and the raw statistics."""
+    profile = cProfile.Profile()
+    result = profile.runcall(eval_function, genome, config)
+    profile.create_stats()
+    return result, profile.stats
+
+
+class ProfileMerger(object):
+    """Accumulates the raw statistics of profiled evaluations."""
+    def __init__(self):
+        self.stats = None
+        self.num_profiled = 0
+
+    def add(self, raw_stats):
+        if self.stats is None:
+            self.stats = pstats.Stats(_ProfileData(raw_stats))
+        else:
+            self.stats.add(_ProfileData(raw_stats))
+        self.num_profiled += 1
+
+
+class ProfileReporter(BaseReporter):
+    """
+    Writes the merged profile of the evaluations profiled by ``evaluator``
+    (a `ParallelEvaluator` created with ``profile_every``) during each
+    generation to ``directory``: ``profile-<generation>.txt`` with the
+    ``top`` functions by cumulative time, and ``profile-<generation>.prof``
+    for `pstats` or tools such as snakeviz.
+    """
+    def __init__(self, evaluator, directory, top=30):
+        self.evaluator = evaluator
+        self.directory = directory
+        self.top = top
+        self.generation = None
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        merger = self.evaluator.take_profile()
+        if merger.stats is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, 'profile-{0}'.format(self.generation))
+        merger.stats.dump_stats(prefix + '.prof')
+
+        text = io.StringIO()
+        merger.stats.stream = text
+        merger.stats.sort_stats('cumulative').print_stats(self.top)
+        with open(prefix + '.txt', 'w') as f:
+            print('Generation {0}: {1} of {2} genomes profiled'.format(
+                self.generation, merger.num_profiled, len(population)), file=f)
+            f.write(text.getvalue())
@@ -4,6 +4,9 @@ are generally intended to  provide information to the user, store checkpoints, e
 """
 from __future__ import division, print_function
 
+import atexit
+import json
+import sys
 import time
 
 from modneat.math_util import mean, stdev
@@ -55,6 +58,13 @@ class ReporterSet(object):
         for r in self.reporters:
             r.info(msg)
 
+    def phase_timings(self, generation, timings, counts):
+        for r in self.reporters:
+            # Reporters written before this hook existed may not have it.
+            hook = getattr(r, 'phase_timings', None)
+            if hook is not None:
+                hook(generation, timings, counts)
+
 
 class BaseReporter(object):
     """Definition of the reporter interface expected by ReporterSet."""
@@ -82,11 +92,30 @@ class BaseReporter(object):
     def info(self, msg):
         pass
 
+    def phase_timings(self, generation, timings, counts):
+        """
+        Called at the end of each generation with the seconds spent in each
+        phase (``evaluation``, ``statistics``, ``reproduction``, ``speciation``,
+        ``reporters`` and the ``total``) and the counts of work done in the
+        generation (see `modneat.instrumentation`).
+        """
+        pass
+
+
+def _format_phase_timings(timings, counts):
+    phases = ', '.join('{0} {1:.3f}'.format(name, seconds) for name, seconds in sorted(timings.items())
+                       if name != 'total')
+    text = 'Phase times (sec): {0} (total {1:.3f})'.format(phases, timings['total'])
+    if counts:
+        text += '\nCounts: ' + ', '.join('{0} {1}'.format(name, n) for name, n in sorted(counts.items()))
+    return text
+
 
 class StdOutReporter(BaseReporter):
     """Uses `print` to output information about the run; an example reporter class."""
-    def __init__(self, show_species_detail):
+    def __init__(self, show_species_detail, show_phase_timings=False):
         self.show_species_detail = show_species_detail
+        self.show_phase_timings = show_phase_timings
         self.generation = None
         self.generation_start_time = None
         self.generation_times = []
@@ -154,88 +183,180 @@ class StdOutReporter(BaseReporter):
     def info(self, msg):
         print(msg)
 
+    def phase_timings(self, generation, timings, counts):
+        if self.show_phase_timings:
+            print(_format_phase_timings(timings, counts))
+
 class FileOutReporter(BaseReporter):
-    """Uses `print` to output information about the run; an example reporter class."""
-    def __init__(self, show_species_detail, savepath):
+    """
+    Writes the same information as `StdOutReporter` to the file ``savepath``,
+    through a single buffered file handle.
+
+    The file is flushed every ``flush_generations`` generations (0 for
+    never) and, if ``flush_seconds`` is not None, whenever that many seconds
+    have passed since the last flush at the end of a generation; it is also
+    flushed when a solution is found, by `flush` and `close`, and at exit.
+    If the reporter is used after `close`, the files are reopened for
+    appending (and closed again by `close` or at exit).
+
+    If ``jsonl_path`` is given, every event is also written there as one
+    JSON object per line (with the keys ``event``, ``generation`` and
+    ``time`` plus the event's data), for processing by other programs.
+    """
+    def __init__(self, show_species_detail, savepath, flush_generations=1, flush_seconds=None, jsonl_path=None):
         self.show_species_detail = show_species_detail
         self.savepath = savepath
+        self.flush_generations = flush_generations
+        self.flush_seconds = flush_seconds
+        self.jsonl_path = jsonl_path
         self.generation = None
         self.generation_start_time = None
         self.generation_times = []
         self.num_extinctions = 0
+        self.generations_since_flush = 0
+        self.last_flush_time = time.time()
 
         #Clear file
-        with open(self.savepath, 'w') as f:
-            print('', file = f)
+        self.file = open(self.savepath, 'w')
+        print('', file=self.file)
+        self.jsonl_file = None if jsonl_path is None else open(jsonl_path, 'w')
+        atexit.register(self.close)
+
+    def _writable(self):
+        """
+        Reopens the files for appending if they were closed; returns False,
+        after a warning, if they cannot be opened.
+        """
+        if not self.file.closed:
+            return True
+        try:
+            self.file = open(self.savepath, 'a')
+            if self.jsonl_path is not None:
+                self.jsonl_file = open(self.jsonl_path, 'a')
+        except OSError:
+            print("*** [WARNING] FileOutputReporter couldn't find a savepath {0}".format(self.savepath),
+                  file=sys.stderr)
+            return False
+        return True
+
+    def _record(self, event, **data):
+        if (self.jsonl_file is not None) and not self.jsonl_file.closed:
+            record = {'event': event, 'generation': self.generation, 'time': time.time()}
+            record.update(data)
+            self.jsonl_file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        """Writes the buffered output to the files."""
+        for f in (self.file, self.jsonl_file):
+            if (f is not None) and not f.closed:
+                f.flush()
+        self.generations_since_flush = 0
+        self.last_flush_time = time.time()
+
+    def close(self):
+        """Flushes and closes the files."""
+        self.flush()
+        for f in (self.file, self.jsonl_file):
+            if f is not None:
+                f.close()
 
     def start_generation(self, generation):
         self.generation = generation
-        with open(self.savepath, 'a') as f:
-            print('\n ****** Running generation {0} ****** \n'.format(generation), file = f)
+        if not self._writable():
+            return
+        print('\n ****** Running generation {0} ****** \n'.format(generation), file=self.file)
+        self._record('start_generation')
         self.generation_start_time = time.time()
 
     def end_generation(self, config, population, species_set):
+        if not self._writable():
+            return
         ng = len(population)
         ns = len(species_set.species)
-        with open(self.savepath, 'a') as fobj:
-            if self.show_species_detail:
-                print('Population of {0:d} members in {1:d} species:'.format(ng, ns), file=fobj)
-                print("   ID   age  size  fitness  adj fit  stag", file=fobj)
-                print("  ====  ===  ====  =======  =======  ====", file=fobj)
-                for sid in sorted(species_set.species):
-                    s = species_set.species[sid]
-                    a = self.generation - s.created
-                    n = len(s.members)
-                    f = "--" if s.fitness is None else "{:.1f}".format(s.fitness)
-                    af = "--" if s.adjusted_fitness is None else "{:.3f}".format(s.adjusted_fitness)
-                    st = self.generation - s.last_improved
-                    print(
-                        "  {: >4}  {: >3}  {: >4}  {: >7}  {: >7}  {: >4}".format(sid, a, n, f, af, st), file=fobj)
-            else:
-                print('Population of {0:d} members in {1:d} species'.format(ng, ns), file=fobj)
-
-            elapsed = time.time() - self.generation_start_time
-            self.generation_times.append(elapsed)
-            self.generation_times = self.generation_times[-10:]
-            average = sum(self.generation_times) / len(self.generation_times)
-            print('Total extinctions: {0:d}'.format(self.num_extinctions), file=fobj)
-            if len(self.generation_times) > 1:
-                print("Generation time: {0:.3f} sec ({1:.3f} average)".format(elapsed, average), file=fobj)
-            else:
-                print("Generation time: {0:.3f} sec".format(elapsed), file=fobj)
+        fobj = self.file
+        species_data = []
+        if self.show_species_detail:
+            print('Population of {0:d} members in {1:d} species:'.format(ng, ns), file=fobj)
+            print("   ID   age  size  fitness  adj fit  stag", file=fobj)
+            print("  ====  ===  ====  =======  =======  ====", file=fobj)
+            for sid in sorted(species_set.species):
+                s = species_set.species[sid]
+                a = self.generation - s.created
+                n = len(s.members)
+                f = "--" if s.fitness is None else "{:.1f}".format(s.fitness)
+                af = "--" if s.adjusted_fitness is None else "{:.3f}".format(s.adjusted_fitness)
+                st = self.generation - s.last_improved
+                print(
+                    "  {: >4}  {: >3}  {: >4}  {: >7}  {: >7}  {: >4}".format(sid, a, n, f, af, st), file=fobj)
+                species_data.append({'id': sid, 'age': a, 'size': n, 'fitness': s.fitness,
+                                     'adjusted_fitness': s.adjusted_fitness, 'stagnation': st})
+        else:
+            print('Population of {0:d} members in {1:d} species'.format(ng, ns), file=fobj)
+
+        elapsed = time.time() - self.generation_start_time
+        self.generation_times.append(elapsed)
+        self.generation_times = self.generation_times[-10:]
+        average = sum(self.generation_times) / len(self.generation_times)
+        print('Total extinctions: {0:d}'.format(self.num_extinctions), file=fobj)
+        if len(self.generation_times) > 1:
+            print("Generation time: {0:.3f} sec ({1:.3f} average)".format(elapsed, average), file=fobj)
+        else:
+            print("Generation time: {0:.3f} sec".format(elapsed), file=fobj)
+        self._record('end_generation', population_size=ng, num_species=ns, species=species_data,
+                     extinctions=self.num_extinctions, generation_time=elapsed, average_generation_time=average)
+
+        self.generations_since_flush += 1
+        if (self.flush_generations and self.generations_since_flush >= self.flush_generations) or \
+                (self.flush_seconds is not None and time.time() - self.last_flush_time >= self.flush_seconds):
+            self.flush()
 
     def post_evaluate(self, config, population, species, best_genome):
         # pylint: disable=no-self-use
+        if not self._writable():
+            return
         fitnesses = [c.fitness for c in population.values()]
         fit_mean = mean(fitnesses)
         fit_std = stdev(fitnesses)
         best_species_id = species.get_species_id(best_genome.key)
-        with open(self.savepath, 'a') as f:
-            print('Population\'s average fitness: {0:3.5f} stdev: {1:3.5f}'.format(fit_mean, fit_std), file=f)
-            print(
-                'Best fitness: {0:3.5f} - size: {1!r} - species {2} - id {3}'.format(best_genome.fitness,
-                                                                                    best_genome.size(),
-                                                                                    best_species_id,
-                                                                                    best_genome.key), file=f)
+        print('Population\'s average fitness: {0:3.5f} stdev: {1:3.5f}'.format(fit_mean, fit_std), file=self.file)
+        print(
+            'Best fitness: {0:3.5f} - size: {1!r} - species {2} - id {3}'.format(best_genome.fitness,
+                                                                                best_genome.size(),
+                                                                                best_species_id,
+                                                                                best_genome.key), file=self.file)
+        self._record('post_evaluate', mean_fitness=fit_mean, stdev_fitness=fit_std,
+                     best_fitness=best_genome.fitness, best_size=best_genome.size(),
+                     best_species=best_species_id, best_id=best_genome.key)
 
     def complete_extinction(self):
         self.num_extinctions += 1
-        with open(self.savepath, 'a') as f:
-            print('All species extinct.', file=f)
+        if not self._writable():
+            return
+        print('All species extinct.', file=self.file)
+        self._record('complete_extinction')
 
     def found_solution(self, config, generation, best):
-        with open(self.savepath, 'a') as f:
-            print('\nBest individual in generation {0} meets fitness threshold - complexity: {1!r}'.format(
-                self.generation, best.size()), file=f)
+        if not self._writable():
+            return
+        print('\nBest individual in generation {0} meets fitness threshold - complexity: {1!r}'.format(
+            self.generation, best.size()), file=self.file)
+        self._record('found_solution', complexity=best.size())
+        self.flush()
 
     def species_stagnant(self, sid, species):
-        with open(self.savepath, 'a') as f:
-            if self.show_species_detail:
-                print("\nSpecies {0} with {1} members is stagnated: removing it".format(sid, len(species.members)), file=f)
+        if not self._writable():
+            return
+        if self.show_species_detail:
+            print("\nSpecies {0} with {1} members is stagnated: removing it".format(sid, len(species.members)), file=self.file)
+        self._record('species_stagnant', species=sid, size=len(species.members))
 
     def info(self, msg):
-        try:
-            with open(self.savepath, 'a') as f:
-                print(msg, file=f)
-        except:
-            print(f"*** [WARNING] FileOutputReporter couldn't find a savepath {self.savepath}")
+        if not self._writable():
+            return
+        print(msg, file=self.file)
+        self._record('info', message=msg)
+
+    def phase_timings(self, generation, timings, counts):
+        if not self._writable():
+            return
+        self._record('phase_timings', timings=timings, counts=counts)
@@ -5,10 +5,12 @@ asexual reproduction from parents.
 from __future__ import division
 
 import math
+import os
 import random
 from itertools import count
 
 from modneat.config import ConfigParameter, DefaultClassConfig
+from modneat.genealogy import GenealogyLog, RecentAncestry
 from modneat.math_util import mean
 
 # TODO: Provide some sort of optional cross-species performance criteria, which
@@ -28,7 +30,10 @@ class DefaultReproduction(DefaultClassConfig):
         return DefaultClassConfig(param_dict,
                                   [ConfigParameter('elitism', int, 0),
                                    ConfigParameter('survival_threshold', float, 0.2),
-                                   ConfigParameter('min_species_size', int, 2)])
+                                   ConfigParameter('min_species_size', int, 2),
+                                   ConfigParameter('ancestry', str, 'all'),
+                                   ConfigParameter('ancestry_generations', int, 2),
+                                   ConfigParameter('ancestry_log', str, 'genealogy.bin')])
 
     def __init__(self, config, reporters, stagnation):
         # pylint: disable=super-init-not-called
@@ -36,7 +41,50 @@ class DefaultReproduction(DefaultClassConfig):
         self.reporters = reporters
         self.genome_indexer = count(1)
         self.stagnation = stagnation
-        self.ancestors = {}
+        self.ancestors = self.create_ancestry(config)
+
+    def set_directory(self, directory):
+        """Writes the files of the reproduction (a relative ``ancestry_log``) in ``directory``, the run's directory."""
+        self.ancestors = self.create_ancestry(self.reproduction_config, directory)
+
+    @staticmethod
+    def create_ancestry(config, directory=None):
+        """Returns the record of the parents of new genomes for the ``ancestry`` setting (see `modneat.genealogy`)."""
+        if config.ancestry == 'all':
+            return {}
+        if config.ancestry == 'recent':
+            return RecentAncestry(config.ancestry_generations)
+        if config.ancestry == 'none':
+            return RecentAncestry(0)
+        if config.ancestry == 'log':
+            return GenealogyLog(DefaultReproduction.ancestry_path(config, directory),
+                                cache_generations=config.ancestry_generations)
+        raise RuntimeError("Unexpected ancestry: {0!r}".format(config.ancestry))
+
+    @staticmethod
+    def ancestry_path(config, directory=None):
+        """Returns the path of the genealogy log of the run in ``directory``."""
+        if directory is None:
+            return config.ancestry_log
+        return os.path.join(directory, config.ancestry_log)
+
+    def resume(self, population, source_directory=None):
+        """
+        Continues after the genomes of ``population``, restored from a
+        checkpoint saved by the run in ``source_directory``: new genomes get
+        keys above theirs, and a genealogy log continues the log of that run
+        without changing it (see `GenealogyLog.resume`).
+        """
+        if not population:
+            return
+        last_key = max(population)
+        next_key = last_key + 1
+        if hasattr(self.ancestors, 'resume'):
+            source = None
+            if source_directory is not None:
+                source = self.ancestry_path(self.reproduction_config, source_directory)
+            next_key = self.ancestors.resume(last_key, source)
+        self.genome_indexer = count(next_key)
 
     def create_new(self, genome_type, genome_config, num_genomes):
         new_genomes = {}
@@ -81,14 +129,23 @@ class DefaultReproduction(DefaultClassConfig):
 
         return spawn_amounts
 
-    def reproduce(self, config, species, pop_size, generation):
+    def reproduce(self, config, species, pop_size, generation, spawn_callback=None):
         """
         Handles creation of genomes, either from scratch or by sexual or
         asexual reproduction from parents.
+
+        If ``spawn_callback`` is given, it is called as ``spawn_callback(genome_id, genome)``
+        for every member of the new population as soon as that member is final
+        (elites when they are carried over, offspring right after mutation),
+        so that evaluation can begin before the whole generation is created.
         """
         # TODO: I don't like this modification of the species and stagnation objects,
         # because it requires internal knowledge of the objects.
 
+        # Bounded ancestry records drop their oldest generation here; the plain dict keeps everything.
+        if hasattr(self.ancestors, 'next_generation'):
+            self.ancestors.next_generation()
+
         # Filter out stagnated species, collect the set of non-stagnated
         # species members, and compute their average adjusted fitness.
         # The average adjusted fitness scheme (normalized to the interval
@@ -158,6 +215,8 @@ class DefaultReproduction(DefaultClassConfig):
                 for i, m in old_members[:self.reproduction_config.elitism]:
                     new_population[i] = m
                     spawn -= 1
+                    if spawn_callback is not None:
+                        spawn_callback(i, m)
 
             if spawn <= 0:
                 continue
@@ -184,5 +243,7 @@ class DefaultReproduction(DefaultClassConfig):
                 child.mutate(config.genome_config)
                 new_population[gid] = child
                 self.ancestors[gid] = (parent1_id, parent2_id)
+                if spawn_callback is not None:
+                    spawn_callback(gid, child)
 
         return new_population
@@ -14,11 +14,28 @@ def create_parser():
     parser.add_argument('--config', type=str, help='', default='./configs/modexhebb_genome.ini')
     parser.add_argument('--checkpoint_interval', type=int, help='', default=100)
     parser.add_argument('--checkpoint_load', type=str, help='', default='')
+    parser.add_argument('--checkpoint_format', type=str, choices=['pickle', 'columnar', 'incremental'], default='pickle',
+                        help="'columnar' writes compact binary checkpoints, 'incremental' only the genomes new since the last one")
     parser.add_argument('--savedir', type=str, help='', default='./results')
     parser.add_argument('--task', type=str, help='', default='non_static')
     parser.add_argument('--generation', type=int, help='', default=100)
+    parser.add_argument('--checkpoint_codec', type=str, default='gzip',
+                        help="compression of pickle checkpoints: none, gzip, lzma (zstd, lz4 if installed)")
+    parser.add_argument('--streaming_statistics', action='store_true',
+                        help='keep the statistics in log files in <savedir>/statistics instead of in memory')
+    parser.add_argument('--plot_interval', type=int, default=0,
+                        help='draw the fitness/speciation figures every N generations (0: only those the task draws at the end)')
+    parser.add_argument('--memory_interval', type=int, default=0,
+                        help='measure the memory held by the run every N generations and log it to <savedir>/memory.jsonl (0: off)')
+    parser.add_argument('--trace_allocations', action='store_true',
+                        help='with --memory_interval, also trace the allocations of the generations measured (slow)')
+    parser.add_argument('--background_checkpoints', action='store_true', help='write checkpoints and figures in a background process')
     parser.add_argument('--run_id', type=int, help='', default=0)
     parser.add_argument('--num_workers', type=int, help='', default=0)
+    parser.add_argument('--pipelined', action='store_true', help='overlap reproduction/speciation with evaluation (needs --num_workers > 1)')
+    parser.add_argument('--fitness_cache', action='store_true', help='reuse the fitness of genetically identical genomes (deterministic tasks only; not with --pipelined)')
+    parser.add_argument('--profile_every', type=int, default=0,
+                        help='profile every N-th genome in the workers and write summaries to <savedir>/profiles (needs --num_workers > 1)')
     parser.add_argument('--description', type=str, help='description of an experiment', default='No description')
 
     args = parser.parse_args()
@@ -38,29 +55,61 @@ def run_experiment(config_file, num_workers):
 
     # Create the population, which is the top-level object for a NEAT run.
     if(CHECKPOINT_LOAD_PATH == ''):
-        p = modneat.Population(config)
+        p = modneat.Population(config, savedir=out_dir)
     else:
-        p = modneat.Checkpointer.restore_checkpoint(CHECKPOINT_LOAD_PATH)
+        p = modneat.Checkpointer.restore_checkpoint(CHECKPOINT_LOAD_PATH, savedir=out_dir)
 
     # Add a stdout reporter to show progress in the terminal.
     p.add_reporter(modneat.StdOutReporter(True))
-    p.add_reporter(modneat.FileOutReporter(True, out_dir + '/results.txt'))
-    stats = modneat.StatisticsReporter()
+    file_reporter = modneat.FileOutReporter(True, out_dir + '/results.txt', jsonl_path=out_dir + '/results.jsonl')
+    p.add_reporter(file_reporter)
+    if STREAMING_STATISTICS:
+        stats = modneat.StreamingStatisticsReporter(os.path.join(out_dir, 'statistics'))
+    else:
+        stats = modneat.StatisticsReporter(generation_statistics_window=10)
     p.add_reporter(stats)
-    p.add_reporter(modneat.Checkpointer(savedir=out_dir, stats=stats, generation_interval=CHECKPOINT_INTERVAL,\
-                                        time_interval_seconds=None))
+    checkpointer = modneat.Checkpointer(savedir=out_dir, stats=stats, generation_interval=CHECKPOINT_INTERVAL,\
+                                        time_interval_seconds=None,
+                                        checkpoint_format='pickle' if CHECKPOINT_FORMAT == 'pickle' else 'columnar',
+                                        incremental=(CHECKPOINT_FORMAT == 'incremental'),
+                                        background=BACKGROUND_CHECKPOINTS,
+                                        codec=CHECKPOINT_CODEC)
+    p.add_reporter(checkpointer)
+    if PLOT_INTERVAL > 0:
+        plotter = modneat.PlotReporter(out_dir, stats, generation_interval=PLOT_INTERVAL,
+                                       background=BACKGROUND_CHECKPOINTS)
+        p.add_reporter(plotter)
+    if MEMORY_INTERVAL > 0:
+        p.add_reporter(modneat.MemoryReporter(p.reproduction, stats, generation_interval=MEMORY_INTERVAL,
+                                              jsonl_path=os.path.join(out_dir, 'memory.jsonl'),
+                                              trace_allocations=TRACE_ALLOCATIONS))
+
+    def memoized(fitness_function):
+        if not FITNESS_CACHE:
+            return fitness_function
+        return modneat.FitnessCache(fitness_function, reporters=p.reporters).evaluate
 
     # Run for up to args.generations.
     if(num_workers == 0 or num_workers == 1):
-        best_genome = p.run(TASK.eval_genomes, GENERATION)
+        best_genome = p.run(memoized(TASK.eval_genomes), GENERATION)
     else:
         if(hasattr(TASK, 'eval_single_genome')):
-            parallel_evaluator = parallel.ParallelEvaluator(num_workers=num_workers, eval_function=TASK.eval_single_genome)
-            best_genome = p.run(parallel_evaluator.evaluate, GENERATION)
+            with parallel.ParallelEvaluator(num_workers=num_workers, eval_function=TASK.eval_single_genome,
+                                            profile_every=PROFILE_EVERY) as parallel_evaluator:
+                if PROFILE_EVERY > 0:
+                    p.add_reporter(modneat.ProfileReporter(parallel_evaluator, os.path.join(out_dir, 'profiles')))
+                if PIPELINED:
+                    best_genome = p.run_pipelined(parallel_evaluator, GENERATION)
+                else:
+                    best_genome = p.run(memoized(parallel_evaluator.evaluate), GENERATION)
         else:
             print(f"Error: {TASK} has no method 'eval_single_genome'.")
             print("please implement 'eval_single_genome' func for multithreading.")
             sys.exit()
+    checkpointer.close()
+    if PLOT_INTERVAL > 0:
+        plotter.close()
+    file_reporter.close()
     TASK.show_results(best_genome, config, stats, out_dir)
 
 
@@ -97,7 +146,17 @@ if __name__ == '__main__':
     GENERATION = args.generation
     CHECKPOINT_INTERVAL = args.checkpoint_interval
     CHECKPOINT_LOAD_PATH = args.checkpoint_load
+    CHECKPOINT_FORMAT = args.checkpoint_format
+    BACKGROUND_CHECKPOINTS = args.background_checkpoints
+    PLOT_INTERVAL = args.plot_interval
+    MEMORY_INTERVAL = args.memory_interval
+    TRACE_ALLOCATIONS = args.trace_allocations
+    STREAMING_STATISTICS = args.streaming_statistics
+    CHECKPOINT_CODEC = args.checkpoint_codec
     NUM_WORKERS = args.num_workers
+    PIPELINED = args.pipelined
+    FITNESS_CACHE = args.fitness_cache
+    PROFILE_EVERY = args.profile_every
 
     # The directory to store outputs
     if(CHECKPOINT_LOAD_PATH == ''):
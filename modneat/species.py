@@ -1,6 +1,7 @@
 """Divides the population into species based on genomic distances."""
 from itertools import count
 
+from modneat import instrumentation
 from modneat.config import ConfigParameter, DefaultClassConfig
 from modneat.math_util import mean, stdev
 
@@ -14,6 +15,9 @@ class Species(object):
         self.members = {}
         self.fitness = None
         self.adjusted_fitness = None
+        # The best species fitness so far, and the species fitness of the last generations
+        # (bounded by DefaultStagnation's fitness_history_length).
+        self.best_fitness = None
         self.fitness_history = []
 
     def update(self, representative, members):
@@ -134,6 +138,9 @@ class DefaultSpeciesSet(DefaultClassConfig):
             member_dict = dict((gid, population[gid]) for gid in members)
             s.update(population[rid], member_dict)
 
+        instrumentation.count('distances_computed', distances.misses)
+        instrumentation.count('distance_cache_hits', distances.hits)
+
         gdmean = mean(distances.distances.values())
         gdstdev = stdev(distances.distances.values())
         self.reporters.info(
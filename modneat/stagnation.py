@@ -1,5 +1,6 @@
 """Keeps track of whether species are making progress and helps remove ones that are not."""
 import sys
+from collections import deque
 
 from modneat.config import ConfigParameter, DefaultClassConfig
 from modneat.math_util import stat_functions
@@ -14,7 +15,8 @@ class DefaultStagnation(DefaultClassConfig):
         return DefaultClassConfig(param_dict,
                                   [ConfigParameter('species_fitness_func', str, 'mean'),
                                    ConfigParameter('max_stagnation', int, 15),
-                                   ConfigParameter('species_elitism', int, 0)])
+                                   ConfigParameter('species_elitism', int, 0),
+                                   ConfigParameter('fitness_history_length', int, 100)])
 
     def __init__(self, config, reporters):
         # pylint: disable=super-init-not-called
@@ -36,18 +38,26 @@ class DefaultStagnation(DefaultClassConfig):
         in which case the highest-fitness species are spared -
         returns a list with stagnant species marked for removal.
         """
+        history_length = self.stagnation_config.fitness_history_length
         species_data = []
         for sid, s in species_set.species.items():
-            if s.fitness_history:
+            # Species restored from checkpoints written before the best fitness was kept have only the history.
+            prev_fitness = getattr(s, 'best_fitness', None)
+            if (prev_fitness is None) and s.fitness_history:
                 prev_fitness = max(s.fitness_history)
-            else:
+            if prev_fitness is None:
                 prev_fitness = -sys.float_info.max
 
+            if not isinstance(s.fitness_history, deque) or s.fitness_history.maxlen != history_length:
+                s.fitness_history = deque(s.fitness_history, maxlen=history_length)
+
             s.fitness = self.species_fitness_func(s.get_fitnesses())
             s.fitness_history.append(s.fitness)
             s.adjusted_fitness = None
-            if prev_fitness is None or s.fitness > prev_fitness:
+            s.best_fitness = prev_fitness
+            if s.fitness > prev_fitness:
                 s.last_improved = generation
+                s.best_fitness = s.fitness
 
             species_data.append((sid, s))
 
@@ -4,23 +4,69 @@ the most-fit genomes and information on genome/species fitness and species sizes
 """
 import copy
 import csv
+import json
+import os
+import pickle
+from array import array
+from collections import deque
 
 from modneat.math_util import mean, stdev, median2
 from modneat.reporting import BaseReporter
 
 
-# TODO: Make a version of this reporter that doesn't continually increase memory usage.
-# (Maybe periodically write blocks of history to disk, or log stats in a database?)
+def summarize_generation(species, best_genome):
+    """
+    Returns the summary of a generation which is kept by the statistics
+    reporters: the best, mean, standard deviation and median of the fitness,
+    and for each species id its size and mean fitness (None if it is empty).
+    """
+    scores = []
+    species_summary = {}
+    for sid, s in species.species.items():
+        fitnesses = [m.fitness for m in s.members.values()]
+        scores.extend(fitnesses)
+        species_summary[sid] = (len(fitnesses), mean(fitnesses) if fitnesses else None)
+    return {'best': best_genome.fitness,
+            'mean': mean(scores),
+            'stdev': stdev(scores),
+            'median': median2(scores),
+            'species': species_summary}
+
+
+def _pad_rows(rows, width, fill):
+    """Extends the rows shorter than ``width`` with ``fill`` (in place); returns the rows."""
+    for row in rows:
+        if len(row) < width:
+            row.extend([fill] * (width - len(row)))
+    return rows
+
 
 class StatisticsReporter(BaseReporter):
     """
     Gathers (via the reporting interface) and provides (to callers and/or a file)
     the most-fit genomes and information on genome/species fitness and species sizes.
+
+    The fitness statistics are summarized once per generation (see
+    `summarize_generation`), and the species sizes and mean fitnesses are
+    appended as one row per generation to ``species_sizes`` and
+    ``species_fitness`` (the older rows are padded when new species appear,
+    as they are read), so the ``get_*`` queries only read these.
+
+    The fitnesses of each generation are kept as a flat array in
+    ``fitness_scores``, which `get_fitness_stat` reads. The fitness of every
+    member of every species, by species and genome key, is kept in
+    ``generation_statistics``; if ``generation_statistics_window`` is not
+    None, only for that many of the last generations.
     """
-    def __init__(self):
+    def __init__(self, generation_statistics_window=None):
         BaseReporter.__init__(self)
         self.most_fit_genomes = []
-        self.generation_statistics = []
+        self.generation_statistics = deque(maxlen=generation_statistics_window)
+        self.fitness_scores = []
+        self.summaries = []
+        self.species_sizes = []
+        self.species_fitness = []
+        self.max_species_id = 0
 
     def post_evaluate(self, config, population, species, best_genome):
         self.most_fit_genomes.append(copy.deepcopy(best_genome))
@@ -30,28 +76,44 @@ class StatisticsReporter(BaseReporter):
         for sid, s in species.species.items():
             species_stats[sid] = dict((k, v.fitness) for k, v in s.members.items())
         self.generation_statistics.append(species_stats)
+        scores = [fitness for members in species_stats.values() for fitness in members.values()]
+        try:
+            self.fitness_scores.append(array('d', scores))
+        except TypeError:
+            # Some genomes have no (numeric) fitness.
+            self.fitness_scores.append(scores)
+
+        summary = summarize_generation(species, best_genome)
+        species_summary = summary.pop('species')
+        self.summaries.append(summary)
+        self.max_species_id = max([self.max_species_id] + list(species.species))
+        sids = range(1, self.max_species_id + 1)
+        self.species_sizes.append([species_summary[sid][0] if sid in species_summary else 0 for sid in sids])
+        self.species_fitness.append([species_summary[sid][1] if sid in species_summary else None
+                                     for sid in sids])
+
+    def _summary_stat(self, name):
+        return [summary[name] for summary in self.summaries]
 
     def get_fitness_stat(self, f):
-        stat = []
-        for stats in self.generation_statistics:
-            scores = []
-            for species_stats in stats.values():
-                scores.extend(species_stats.values())
-            stat.append(f(scores))
+        """Returns ``f`` of the list of the fitnesses of each generation."""
+        return [f(list(scores)) for scores in self.fitness_scores]
 
-        return stat
+    def get_fitness_best(self):
+        """Get the per-generation best fitness."""
+        return self._summary_stat('best')
 
     def get_fitness_mean(self):
         """Get the per-generation mean fitness."""
-        return self.get_fitness_stat(mean)
+        return self._summary_stat('mean')
 
     def get_fitness_stdev(self):
         """Get the per-generation standard deviation of the fitness."""
-        return self.get_fitness_stat(stdev)
+        return self._summary_stat('stdev')
 
     def get_fitness_median(self):
         """Get the per-generation median fitness."""
-        return self.get_fitness_stat(median2)
+        return self._summary_stat('median')
 
     def best_unique_genomes(self, n):
         """Returns the most n fit genomes, with no duplication."""
@@ -78,6 +140,7 @@ class StatisticsReporter(BaseReporter):
 
     def save(self):
         self.save_genome_fitness()
+        self.save_fitness_stdev()
         self.save_species_count()
         self.save_species_fitness()
 
@@ -88,12 +151,19 @@ class StatisticsReporter(BaseReporter):
         with open(filename, 'w') as f:
             w = csv.writer(f, delimiter=delimiter)
 
-            best_fitness = [c.fitness for c in self.most_fit_genomes]
+            best_fitness = self.get_fitness_best()
             avg_fitness = self.get_fitness_mean()
 
             for best, avg in zip(best_fitness, avg_fitness):
                 w.writerow([best, avg])
 
+    def save_fitness_stdev(self, filename='fitness_stdev.csv'):
+        """ Saves the standard deviation of the population's fitness. """
+        with open(filename, 'w') as f:
+            w = csv.writer(f)
+            for sd in self.get_fitness_stdev():
+                w.writerow([sd])
+
     def save_species_count(self, delimiter=' ', filename='speciation.csv'):
         """ Log speciation throughout evolution. """
         with open(filename, 'w') as f:
@@ -109,33 +179,131 @@ class StatisticsReporter(BaseReporter):
                 w.writerow(s)
 
     def get_species_sizes(self):
-        all_species = set()
-        for gen_data in self.generation_statistics:
-            all_species = all_species.union(gen_data.keys())
+        return [list(row) for row in _pad_rows(self.species_sizes, self.max_species_id, 0)]
+
+    def get_species_fitness(self, null_value=''):
+        return [[null_value if f is None else f for f in row]
+                for row in _pad_rows(self.species_fitness, self.max_species_id, None)]
+
+
+class StreamingStatisticsReporter(StatisticsReporter):
+    """
+    A `StatisticsReporter` whose memory use does not grow with the length of
+    the run: every generation is appended to two logs in ``directory`` and
+    only the best genome so far is kept in memory.
+
+    ``generations.jsonl`` holds one JSON object per generation with the
+    fitness of every member of every species, and ``best_genomes.pickle``
+    a pickle of the best genome of every generation (without its ``history``,
+    unless ``keep_history`` is True). ``generation_statistics``,
+    ``summaries`` and ``most_fit_genomes`` read these logs when accessed, so all the queries of
+    `StatisticsReporter` work as before (at the cost of a scan of the logs).
+    Existing logs in ``directory`` are overwritten.
+    """
+    GENERATIONS_FILE = 'generations.jsonl'
+    GENOMES_FILE = 'best_genomes.pickle'
 
-        max_species = max(all_species)
+    def __init__(self, directory, keep_history=False):
+        BaseReporter.__init__(self)
+        self.directory = directory
+        self.keep_history = keep_history
+        self.generations_file = os.path.join(directory, self.GENERATIONS_FILE)
+        self.genomes_file = os.path.join(directory, self.GENOMES_FILE)
+        self.num_generations = 0
+        self.max_species_id = 0
+        self.best = None
+
+        os.makedirs(directory, exist_ok=True)
+        for filename in (self.generations_file, self.genomes_file):
+            open(filename, 'wb').close()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        summary = summarize_generation(species, best_genome)
+        summary['species'] = [[sid, size, fitness] for sid, (size, fitness) in summary['species'].items()]
+        record = {'species': dict((str(sid), [[k, v.fitness] for k, v in s.members.items()])
+                                  for sid, s in species.species.items()),
+                  'summary': summary}
+        with open(self.generations_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        # Copy the genome without its history (which holds copies of the network).
+        state = best_genome.__dict__
+        if not self.keep_history:
+            state = dict((k, v) for k, v in state.items() if k != 'history')
+        genome = copy.copy(best_genome)
+        genome.__dict__ = copy.deepcopy(state)
+        with open(self.genomes_file, 'ab') as f:
+            pickle.dump(genome, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        if (self.best is None) or (genome.fitness > self.best.fitness):
+            self.best = genome
+        self.num_generations += 1
+        self.max_species_id = max([self.max_species_id] + list(species.species))
+
+    @property
+    def generation_statistics(self):
+        """The fitness of the members of each species in each generation, read from the log."""
+        stats = []
+        with open(self.generations_file) as f:
+            for line in f:
+                record = json.loads(line)
+                stats.append(dict((int(sid), dict((k, v) for k, v in members))
+                                  for sid, members in record['species'].items()))
+        return stats
+
+    @property
+    def summaries(self):
+        """The summary of each generation (see `summarize_generation`), read from the log."""
+        summaries = []
+        with open(self.generations_file) as f:
+            for line in f:
+                summary = json.loads(line)['summary']
+                summary['species'] = dict((sid, (size, fitness)) for sid, size, fitness in summary['species'])
+                summaries.append(summary)
+        return summaries
+
+    @property
+    def most_fit_genomes(self):
+        """The best genome of each generation, read from the log."""
+        genomes = []
+        with open(self.genomes_file, 'rb') as f:
+            while True:
+                try:
+                    genomes.append(pickle.load(f))
+                except EOFError:
+                    return genomes
+
+    def get_fitness_stat(self, f):
+        """Returns ``f`` of the list of the fitnesses of each generation (read from the log)."""
+        stat = []
+        for stats in self.generation_statistics:
+            scores = []
+            for species_stats in stats.values():
+                scores.extend(species_stats.values())
+            stat.append(f(scores))
+
+        return stat
+
+    def get_species_sizes(self):
         species_counts = []
-        for gen_data in self.generation_statistics:
-            species = [len(gen_data.get(sid, [])) for sid in range(1, max_species + 1)]
-            species_counts.append(species)
+        for summary in self.summaries:
+            species = summary['species']
+            species_counts.append([species[sid][0] if sid in species else 0
+                                   for sid in range(1, self.max_species_id + 1)])
 
         return species_counts
 
     def get_species_fitness(self, null_value=''):
-        all_species = set()
-        for gen_data in self.generation_statistics:
-            all_species = all_species.union(gen_data.keys())
-
-        max_species = max(all_species)
         species_fitness = []
-        for gen_data in self.generation_statistics:
-            member_fitness = [gen_data.get(sid, []) for sid in range(1, max_species + 1)]
+        for summary in self.summaries:
             fitness = []
-            for mf in member_fitness:
-                if mf:
-                    fitness.append(mean(mf))
-                else:
-                    fitness.append(null_value)
+            for sid in range(1, self.max_species_id + 1):
+                size, mean_fitness = summary['species'].get(sid, (0, None))
+                fitness.append(null_value if mean_fitness is None else mean_fitness)
             species_fitness.append(fitness)
 
         return species_fitness
+
+    def best_genome(self):
+        """Returns the most fit genome ever seen."""
+        return self.best
@@ -1,7 +1,9 @@
 """Threaded evaluation of genomes"""
 from __future__ import print_function
 
+import time
 import warnings
+from concurrent import futures
 
 try:
     import threading
@@ -11,30 +13,110 @@ except ImportError: # pragma: no cover
 else:
     HAVE_THREADS = True
 
-try:
-    # pylint: disable=import-error
-    import Queue as queue
-except ImportError:
-    # pylint: disable=import-error
-    import queue
+
+# Per-thread (and, in worker processes, per-process) storage for the objects
+# created by a ``context_factory``, so that they are reused between genomes.
+_local = threading.local()
+
+# The context_factory of the evaluator which started this worker process.
+_process_context_factory = None
+
+
+def _get_context(context_factory):
+    """Returns the context made by ``context_factory`` for the calling thread, creating it on first use."""
+    # Keyed by the factory object rather than by its name, which different
+    # lambdas and closures share; the factory is held, so its id is not reused.
+    contexts = getattr(_local, 'contexts', None)
+    if contexts is None:
+        contexts = _local.contexts = {}
+    entry = contexts.get(id(context_factory))
+    if entry is None:
+        entry = contexts[id(context_factory)] = (context_factory, context_factory())
+    return entry[1]
+
+
+def _install_context_factory(context_factory):
+    """Initializer of worker processes: keeps the factory, which is sent once rather than with every batch."""
+    global _process_context_factory  # pylint: disable=global-statement
+    _process_context_factory = context_factory
+
+
+def _process_context():
+    """
+    Stands for the installed factory in the batches sent to worker processes:
+    a freshly unpickled factory would be a new object for every batch, but
+    this function unpickles to itself.
+    """
+    return _process_context_factory()
+
+
+def _evaluate_batch(eval_function, context_factory, batch, config):
+    """Evaluates a batch of (genome_id, genome) pairs; runs in a worker thread or process."""
+    results = []
+    if context_factory is None:
+        for genome_id, genome in batch:
+            results.append((genome_id, eval_function(genome, config)))
+    else:
+        context = _get_context(context_factory)
+        for genome_id, genome in batch:
+            results.append((genome_id, eval_function(genome, config, context)))
+    return results
+
+
+def _assign_result(genome, result):
+    """Accepts either a plain fitness or a (fitness, history) tuple as for ParallelEvaluator."""
+    if isinstance(result, tuple):
+        genome.fitness, genome.history = result
+    else:
+        genome.fitness = result
+
+
+def _batched(genomes, batch_size):
+    genomes = list(genomes)
+    return [genomes[i:i + batch_size] for i in range(0, len(genomes), batch_size)]
+
+
+def _run_batches(executor, eval_function, context_factory, genomes, config, batch_size):
+    """Submits the genomes in batches and assigns the results as they complete."""
+    id2genome = dict(genomes)
+    jobs = [executor.submit(_evaluate_batch, eval_function, context_factory, batch, config)
+            for batch in _batched(genomes, batch_size)]
+    for job in futures.as_completed(jobs):
+        for genome_id, result in job.result():
+            _assign_result(id2genome[genome_id], result)
 
 
 class ThreadedEvaluator(object):
     """
-    A threaded genome evaluator.
-    Useful on python implementations without GIL (Global Interpreter Lock).
+    A threaded genome evaluator, built on `concurrent.futures`.
+    Useful on python implementations without GIL (Global Interpreter Lock),
+    and for evaluation functions that spend their time outside of the
+    interpreter (waiting on simulators or sockets, or in NumPy code that
+    releases the GIL).
+
+    Idle threads take the next batch from the shared queue of the executor, so
+    slow genomes do not hold up the remaining ones.
     """
-    def __init__(self, num_workers, eval_function):
+    def __init__(self, num_workers, eval_function, batch_size=1, context_factory=None):
         """
         eval_function should take two arguments (a genome object and the
-        configuration) and return a single float (the genome's fitness).
+        configuration) and return a single float (the genome's fitness), or
+        a (fitness, history) tuple as for ParallelEvaluator.
+
+        If ``context_factory`` is given, it is called (without arguments) once
+        per worker thread, and its result - e.g. a simulator environment or a
+        connection - is passed to eval_function as a third argument for every
+        genome evaluated by that thread.
+
+        ``batch_size`` genomes are handed to a thread at once, which reduces
+        the scheduling overhead for very short evaluations.
         """
         self.num_workers = num_workers
         self.eval_function = eval_function
-        self.workers = []
+        self.batch_size = batch_size
+        self.context_factory = context_factory
+        self.executor = None
         self.working = False
-        self.inqueue = queue.Queue()
-        self.outqueue = queue.Queue()
 
         if not HAVE_THREADS: # pragma: no cover
             warnings.warn("No threads available; use ParallelEvaluator, not ThreadedEvaluator")
@@ -44,56 +126,124 @@ class ThreadedEvaluator(object):
         Called on deletion of the object. We stop our workers here.
         WARNING: __del__ may not always work!
         Please stop the threads explicitly by calling self.stop()!
-        TODO: ensure that there are no reference-cycles.
         """
         if self.working:
             self.stop()
 
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
     def start(self):
         """Starts the worker threads"""
         if self.working:
             return
         self.working = True
-        for i in range(self.num_workers):
-            w = threading.Thread(
-                name="Worker Thread #{i}".format(i=i),
-                target=self._worker,
-                )
-            w.daemon = True
-            w.start()
-            self.workers.append(w)
+        self.executor = futures.ThreadPoolExecutor(max_workers=self.num_workers,
+                                                   thread_name_prefix="Worker Thread")
 
     def stop(self):
         """Stops the worker threads and waits for them to finish"""
         self.working = False
-        for w in self.workers:
-            w.join()
-        self.workers = []
-
-    def _worker(self):
-        """The worker function"""
-        while self.working:
-            try:
-                genome_id, genome, config = self.inqueue.get(
-                    block=True,
-                    timeout=0.2,
-                    )
-            except queue.Empty:
-                continue
-            f = self.eval_function(genome, config)
-            self.outqueue.put((genome_id, genome, f))
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
 
     def evaluate(self, genomes, config):
         """Evaluate the genomes"""
         if not self.working:
             self.start()
-        p = 0
-        for genome_id, genome in genomes:
-            p += 1
-            self.inqueue.put((genome_id, genome, config))
-
-        # assign the fitness back to each genome
-        while p > 0:
-            p -= 1
-            ignored_genome_id, genome, fitness = self.outqueue.get()
-            genome.fitness = fitness
+        _run_batches(self.executor, self.eval_function, self.context_factory,
+                     genomes, config, self.batch_size)
+
+
+class AdaptiveEvaluator(object):
+    """
+    Chooses between threads and processes by measuring which of them gives the
+    better throughput for the current evaluation function.
+
+    The first ``trial_generations`` generations are evaluated with threads, the
+    next ``trial_generations`` with processes; from then on, the mode with the
+    higher number of genomes evaluated per second is used, and the other pool
+    is shut down.  For processes, ``eval_function`` and ``context_factory``
+    must be picklable (module-level functions, or methods of picklable objects);
+    the factory is sent to each worker process once, when it starts.
+    """
+    MODES = ('threads', 'processes')
+
+    def __init__(self, num_workers, eval_function, batch_size=1, context_factory=None,
+                 trial_generations=1):
+        """See `ThreadedEvaluator` for the meaning of the arguments."""
+        self.num_workers = num_workers
+        self.eval_function = eval_function
+        self.batch_size = batch_size
+        self.context_factory = context_factory
+        self.trial_generations = trial_generations
+        self.executors = {}
+        self.throughput = {}
+        self.mode = None
+        self.generations_evaluated = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stop(self):
+        """Shuts down the threads and/or processes."""
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.executors = {}
+
+    def _get_executor(self, mode):
+        executor = self.executors.get(mode)
+        if executor is None:
+            if mode == 'threads':
+                executor = futures.ThreadPoolExecutor(max_workers=self.num_workers,
+                                                      thread_name_prefix="Worker Thread")
+            else:
+                executor = futures.ProcessPoolExecutor(max_workers=self.num_workers,
+                                                       initializer=_install_context_factory,
+                                                       initargs=(self.context_factory,))
+                # Start the worker processes now, so that their start-up time
+                # is not counted against the throughput of the process mode.
+                list(executor.map(abs, range(self.num_workers)))
+            self.executors[mode] = executor
+        return executor
+
+    def _choose_mode(self):
+        """Picks the faster mode once both have been measured, releasing the other pool."""
+        self.mode = max(self.MODES, key=lambda m: self.throughput[m])
+        for mode in self.MODES:
+            if mode != self.mode and mode in self.executors:
+                self.executors.pop(mode).shutdown(wait=True)
+
+    def _context_factory(self, mode):
+        if (mode == 'processes') and (self.context_factory is not None):
+            return _process_context
+        return self.context_factory
+
+    def evaluate(self, genomes, config):
+        """Evaluate the genomes"""
+        if self.mode is not None:
+            _run_batches(self._get_executor(self.mode), self.eval_function,
+                         self._context_factory(self.mode), genomes, config, self.batch_size)
+            return
+
+        mode = self.MODES[min(1, self.generations_evaluated // self.trial_generations)]
+        executor = self._get_executor(mode)
+        start = time.time()
+        _run_batches(executor, self.eval_function, self._context_factory(mode),
+                     genomes, config, self.batch_size)
+        elapsed = max(time.time() - start, 1e-9)
+        rate = len(genomes) / elapsed
+        # Average over the trial generations of this mode.
+        self.throughput[mode] = self.throughput.get(mode, 0.0) + rate / self.trial_generations
+        self.generations_evaluated += 1
+
+        if self.generations_evaluated >= 2 * self.trial_generations:
+            self._choose_mode()
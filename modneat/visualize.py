@@ -36,10 +36,19 @@ def plot_stats(statistics, ylog=False, view=False, filename='avg_fitness.svg'):
         warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
         return
 
-    generation = range(len(statistics.most_fit_genomes))
-    best_fitness = [c.fitness for c in statistics.most_fit_genomes]
-    avg_fitness = np.array(statistics.get_fitness_mean())
-    stdev_fitness = np.array(statistics.get_fitness_stdev())
+    plot_fitness(statistics.get_fitness_best(), statistics.get_fitness_mean(), statistics.get_fitness_stdev(),
+                 ylog=ylog, view=view, filename=filename)
+
+
+def plot_fitness(best_fitness, avg_fitness, stdev_fitness, ylog=False, view=False, filename='avg_fitness.svg'):
+    """ Plots the population's average and best fitness, given as one value per generation. """
+    if plt is None:
+        warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
+        return
+
+    generation = range(len(best_fitness))
+    avg_fitness = np.array(avg_fitness)
+    stdev_fitness = np.array(stdev_fitness)
 
     plt.plot(generation, avg_fitness, 'b-', label="average")
     plt.plot(generation, avg_fitness - stdev_fitness, 'g-.', label="-1 sd")
@@ -66,7 +75,15 @@ def plot_species(statistics, view=False, filename='speciation.svg'):
         warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
         return
 
-    species_sizes = statistics.get_species_sizes()
+    plot_species_sizes(statistics.get_species_sizes(), view=view, filename=filename)
+
+
+def plot_species_sizes(species_sizes, view=False, filename='speciation.svg'):
+    """ Visualizes speciation, given the size of every species in every generation. """
+    if plt is None:
+        warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
+        return
+
     num_generations = len(species_sizes)
     curves = np.array(species_sizes).T
 